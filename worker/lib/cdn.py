@@ -1,35 +1,157 @@
 import os
+import mimetypes
+import posixpath
+import threading
 import boto3
-from pathlib import Path
-from typing import Optional, Dict, Any
+import botocore.session
+from concurrent.futures import Future, ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from urllib.parse import quote
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
+from lib.json_codec import dumps
+from lib.paths import classify_path
 from lib.zip import zip_build
 from lib.streams import LogStream
 
 
-def prepare_cdn_file(job: Dict[str, Any], stream: LogStream) -> str:
+# Multipart transfer settings shared by all uploads. Parts are uploaded on
+# several threads at once so large builds are not capped by a single stream.
+#
+# Peak memory per file upload is roughly part size x concurrency: the
+# defaults (32 MB x 10) use about 320 MB. For memory-constrained workers set
+# CDN_UPLOAD_CHUNK_MB=8 and CDN_UPLOAD_CONCURRENCY=4 (about 32 MB). Disk reads
+# are done in 256 KB blocks and the IO queue is bounded so completed reads
+# cannot pile up while parts wait to be sent.
+_TRANSFER_CFG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=int(os.environ.get("CDN_UPLOAD_CHUNK_MB", "32")) * 1024 * 1024,
+    max_concurrency=int(os.environ.get("CDN_UPLOAD_CONCURRENCY", "10")),
+    use_threads=True,
+    io_chunksize=256 * 1024,
+    max_io_queue=100,
+)
+
+# How directory builds are sent to the CDN: 'zip' uploads a single archive,
+# 'stream' uploads the archive while it is being created (no temp file) and
+# 'sync' uploads every file individually. Jobs may override with 'cdnMode'.
+CDN_UPLOAD_MODE = os.environ.get("CDN_UPLOAD_MODE", "zip").lower()
+
+# Number of files uploaded at once when syncing a directory
+_SYNC_MAX_WORKERS = 16
+
+# Transfer settings for each file of a directory sync. The files already run
+# _SYNC_MAX_WORKERS at a time, so each one is sent in its calling thread, one
+# part after another; otherwise every file would add up to max_concurrency
+# more requests and the sync would far outrun the client's connection pool.
+_SYNC_TRANSFER_CFG = TransferConfig(
+    multipart_threshold=_TRANSFER_CFG.multipart_threshold,
+    multipart_chunksize=_TRANSFER_CFG.multipart_chunksize,
+    max_concurrency=1,
+    use_threads=False,
+    io_chunksize=_TRANSFER_CFG.io_chunksize,
+    max_io_queue=_TRANSFER_CFG.max_io_queue,
+)
+
+# Number of parts uploaded at once when streaming an archive
+_STREAM_MAX_WORKERS = 8
+
+# One botocore session shared by every client, with the S3 service model
+# loaded eagerly, so the model is parsed once per process instead of once
+# per destination. Credentials are passed per client.
+_BOTOCORE_SESSION = botocore.session.get_session()
+_BOTOCORE_SESSION.get_component('data_loader').load_service_model('s3', 'service-2')
+_SESSION = boto3.Session(botocore_session=_BOTOCORE_SESSION)
+
+# S3 clients keyed by (region, endpoint, accessKeyId) so repeat uploads to
+# the same destination keep their HTTPS connections alive between jobs
+_CLIENT_CACHE: Dict[tuple, Any] = {}
+_CLIENT_CACHE_LOCK = threading.Lock()
+
+
+class _UploadProgress:
+    """Transfer callback that logs upload progress in 10% steps.
+
+    boto3 invokes the callback from its worker threads, so the running
+    byte count is guarded by a lock.
+    """
+
+    def __init__(self, file_path: str, stream_logger: Any) -> None:
+        self._size = os.path.getsize(file_path)
+        self._seen = 0
+        self._next_pct = 10
+        self._lock = threading.Lock()
+        self._stream = stream_logger
+
+    def __call__(self, bytes_amount: int) -> None:
+        with self._lock:
+            self._seen += bytes_amount
+            if not self._size:
+                return
+            pct = self._seen * 100 // self._size
+            if pct < self._next_pct:
+                return
+            self._next_pct = (pct // 10 + 1) * 10
+        self._stream.log(f"Upload progress: {pct}%")
+
+
+def get_cdn_mode(job: Dict[str, Any]) -> str:
+    """Return how directory builds for this job are sent to the CDN ('zip', 'stream' or 'sync')
+    
+    A streamed archive is built separately for each channel it is sent to,
+    so jobs with several CDN channels are zipped once instead and the same
+    archive is uploaded to every channel.
+    """
+    mode = (job.get("cdnMode") or CDN_UPLOAD_MODE).lower()
+    if mode == 'stream' and len(job.get("cdn_channels") or ()) > 1:
+        return 'zip'
+    return mode
+
+
+def prepare_cdn_file(job: Dict[str, Any], stream: LogStream, path_kind: Optional[str] = None) -> str:
     """Prepare build file for CDN upload (zip if directory).
     
+    When the job's CDN mode (see get_cdn_mode) is 'sync' or 'stream', directories
+    are returned as-is so they can be uploaded without an intermediate zip file.
+    
     Args:
         job: The job dictionary containing ingest path information
         stream: LogStream instance for logging progress
+        path_kind: classify_path result for the ingest path, if already known
     
     Returns:
-        Path to the file or zip archive for CDN upload
+        Path to the file, zip archive or directory for CDN upload
     
     Raises:
-        Exception: If the path does not exist or zip creation fails
+        FileNotFoundError: If the path does not exist
+        OSError: If the path exists but cannot be stat'ed
+        Exception: If the path is not a file or directory, or zip creation fails
     """
     absolute_build_path: Optional[str] = job.get("absoluteIngestPath")
+    cdn_mode = get_cdn_mode(job)
     stream.log(f"Preparing build for CDN upload from {job['ingestPath']}...")
 
-    if not absolute_build_path or not os.path.exists(absolute_build_path):
+    # Stat the path once (unless the caller already has) and branch on its type
+    if path_kind is None:
+        try:
+            path_kind = classify_path(absolute_build_path)
+        except OSError as e:
+            stream.log(f"Cannot access build path {absolute_build_path}: {e.strerror}", level="error")
+            raise
+    if path_kind is None:
         stream.log(f"Path does not exist: {absolute_build_path}", level="error")
-        raise Exception(f"Build path does not exist: {absolute_build_path}")
+        raise FileNotFoundError(f"Build path does not exist: {absolute_build_path}")
     
-    if os.path.isfile(absolute_build_path):
+    if path_kind == 'file':
         stream.log(f"Found file: {absolute_build_path}")
         return absolute_build_path
-    elif os.path.isdir(absolute_build_path):
+    elif path_kind == 'dir' and cdn_mode == 'sync':
+        stream.log(f"Found directory: {absolute_build_path}, files will be uploaded individually")
+        return absolute_build_path
+    elif path_kind == 'dir' and cdn_mode == 'stream':
+        stream.log(f"Found directory: {absolute_build_path}, zip archive will be streamed during upload")
+        return absolute_build_path
+    elif path_kind == 'dir':
         stream.log(f"Found directory: {absolute_build_path}, creating zip archive...")
         try:
             return zip_build(job["id"], absolute_build_path, stream)
@@ -50,6 +172,19 @@ class CDNUploader:
         
         self.config: Dict[str, Any] = cdn_destination
         self._init_s3_client()
+        
+        # Settings used on every upload, resolved once from the validated config
+        self.bucket: str = self.config['bucketName']
+        self.path_prefix: str = (self.config.get('path') or '').strip('/')
+        self.is_public: bool = bool(self.config.get('isPublic'))
+        self.endpoint: Optional[str] = self.config.get('endpoint')
+        self.region: str = self.config.get('region', 'us-east-1')
+        if self.endpoint:
+            # Custom endpoint (like MinIO), path-style
+            self._url_base = f"{self.endpoint.rstrip('/')}/{self.bucket}"
+        else:
+            # AWS S3, virtual-hosted style
+            self._url_base = f"https://{self.bucket}.s3.{self.region}.amazonaws.com"
     
     def _init_s3_client(self) -> None:
         """Initialize boto3 S3 client"""
@@ -59,20 +194,45 @@ class CDNUploader:
             if not self.config.get(field):
                 raise ValueError(f"CDN destination must include '{field}'")
         
-        session_kwargs = {
+        # Reuse an existing client (and its connection pool) for this destination
+        cache_key = (
+            self.config.get('region'),
+            self.config.get('endpoint'),
+            self.config.get('accessKeyId'),
+        )
+        with _CLIENT_CACHE_LOCK:
+            client = _CLIENT_CACHE.get(cache_key)
+            if client is None:
+                client = self._create_s3_client()
+                _CLIENT_CACHE[cache_key] = client
+
+        self.s3_client = client
+
+    def _create_s3_client(self) -> Any:
+        """Create a new boto3 S3 client for this destination"""
+        # The connection pool must be at least as large as the transfer
+        # concurrency or multipart threads will wait on each other. Adaptive
+        # retries back off when S3 responds with 503 SlowDown.
+        config_kwargs = {
+            'max_pool_connections': max(10, _TRANSFER_CFG.max_concurrency, _SYNC_MAX_WORKERS, _STREAM_MAX_WORKERS),
+            'retries': {'mode': 'adaptive', 'max_attempts': 5},
+            'tcp_keepalive': True,
+        }
+
+        # Create S3 client with optional custom endpoint. Custom endpoints
+        # (like MinIO) keep botocore's default addressing style.
+        client_kwargs = {
             'region_name': self.config.get('region'),
             'aws_access_key_id': self.config.get('accessKeyId'),
             'aws_secret_access_key': self.config.get('secretAccessKey'),
         }
-        
-        session = boto3.Session(**session_kwargs)
-        
-        # Create S3 client with optional custom endpoint
-        client_kwargs = {}
         if self.config.get('endpoint'):
             client_kwargs['endpoint_url'] = self.config.get('endpoint')
-        
-        self.s3_client = session.client('s3', **client_kwargs)
+        else:
+            config_kwargs['s3'] = {'addressing_style': 'virtual', 'use_accelerate_endpoint': False}
+        client_kwargs['config'] = Config(**config_kwargs)
+
+        return _SESSION.client('s3', **client_kwargs)
     
     def upload_file(self, file_path: str, stream_logger: Optional[Any] = None) -> Dict[str, Any]:
         """
@@ -88,50 +248,29 @@ class CDNUploader:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
         
-        bucket = self.config.get('bucketName')
-        if not bucket:
-            raise ValueError("CDN destination must include 'bucketName'")
+        bucket = self.bucket
         
         # Build S3 key with path prefix
-        path_prefix = self.config.get('path', '').strip('/')
-        file_name = Path(file_path).name
-        s3_key = f"{path_prefix}/{file_name}" if path_prefix else file_name
+        file_name = os.path.basename(file_path)
+        s3_key = self._object_key(file_name)
         
         try:
             if stream_logger:
                 stream_logger.log(f"Uploading {file_name} to S3...")
             
-            # Upload file
-            response = self.s3_client.upload_file(
+            # Upload file, setting the ACL and headers on the initial request
+            # instead of issuing separate calls afterwards
+            self.s3_client.upload_file(
                 file_path,
                 bucket,
-                s3_key
+                s3_key,
+                Config=_TRANSFER_CFG,
+                ExtraArgs=self._extra_args(file_name),
+                Callback=_UploadProgress(file_path, stream_logger) if stream_logger else None
             )
             
-            # Make file public if isPublic flag is set
-            if self.config.get('isPublic'):
-                if stream_logger:
-                    stream_logger.log(f"Setting object ACL to public...")
-                try:
-                    self.s3_client.put_object_acl(
-                        Bucket=bucket,
-                        Key=s3_key,
-                        ACL='public-read'
-                    )
-                    if stream_logger:
-                        stream_logger.log(f"Object is now publicly readable")
-                except Exception as acl_err:
-                    if stream_logger:
-                        stream_logger.log(f"Warning: Could not set public ACL: {str(acl_err)}", level="error")
-            
             # Build public URL
-            if self.config.get('endpoint'):
-                # Custom endpoint (like MinIO)
-                url = f"{self.config.get('endpoint')}/{bucket}/{s3_key}"
-            else:
-                # AWS S3
-                region = self.config.get('region', 'us-east-1')
-                url = f"https://{bucket}.s3.{region}.amazonaws.com/{s3_key}"
+            url = self._object_url(s3_key)
             
             # Log success of upload
             if stream_logger:
@@ -142,7 +281,181 @@ class CDNUploader:
                 'url': url,
                 'bucket': bucket,
                 'key': s3_key,
-                'isPublic': self.config.get('isPublic', False)
+                'isPublic': self.is_public
+            }
+        
+        # Log any errors that occur during upload
+        except Exception as e:
+            if stream_logger:
+                stream_logger.log(f"CDN upload error: {str(e)}", level="error")
+            raise
+    
+    def upload_stream(self, file_name: str, chunks: Iterable[bytes], stream_logger: Optional[Any] = None) -> Dict[str, Any]:
+        """
+        Upload data produced incrementally (e.g. a zip being built) to the CDN
+        
+        Each chunk becomes one part of an S3 multipart upload, so every chunk
+        except the last must be at least 5 MB. Parts are uploaded concurrently
+        while the next chunks are produced; the number of chunks held in memory
+        is bounded by the number of upload threads. Once a part fails no more
+        chunks are taken, so the rest of the data is not produced for nothing.
+        
+        Args:
+            file_name: Name of the object within the channel path
+            chunks: Iterable of byte chunks making up the object
+            stream_logger: Optional LogStream instance for logging progress
+        
+        Returns:
+            dict with keys: url, bucket, key, isPublic
+        """
+        bucket = self.bucket
+        s3_key = self._object_key(file_name)
+        extra_args = self._extra_args(file_name, unique_key=True)
+        
+        if stream_logger:
+            stream_logger.log(f"Streaming {file_name} to S3...")
+        
+        upload_id = self.s3_client.create_multipart_upload(Bucket=bucket, Key=s3_key, **extra_args)['UploadId']
+        try:
+            # Limit how many produced chunks can wait for an upload thread
+            slots = threading.BoundedSemaphore(_STREAM_MAX_WORKERS)
+            failed = threading.Event()
+            
+            def part_done(future: Future) -> None:
+                if future.exception() is not None:
+                    failed.set()
+                slots.release()
+            
+            futures: List[Future] = []
+            chunk_iter = iter(chunks)
+            try:
+                with ThreadPoolExecutor(max_workers=_STREAM_MAX_WORKERS, thread_name_prefix="cdn-part") as executor:
+                    for part_number, chunk in enumerate(chunk_iter, start=1):
+                        slots.acquire()
+                        # Stop producing chunks as soon as any part has failed
+                        if failed.is_set():
+                            break
+                        future = executor.submit(self._upload_part, bucket, s3_key, upload_id, part_number, chunk)
+                        future.add_done_callback(part_done)
+                        futures.append(future)
+            finally:
+                # Lets a generator (e.g. zip_build_stream) release its files
+                close = getattr(chunk_iter, 'close', None)
+                if close:
+                    close()
+            # Surface the first failure, if any
+            parts = [future.result() for future in futures]
+            
+            self.s3_client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        
+        # Abort so incomplete parts are not left (and billed) in the bucket
+        except Exception as e:
+            if stream_logger:
+                stream_logger.log(f"CDN upload error: {str(e)}", level="error")
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=bucket, Key=s3_key, UploadId=upload_id)
+            except Exception as abort_err:
+                if stream_logger:
+                    stream_logger.log(f"Could not abort multipart upload: {str(abort_err)}", level="error")
+            raise
+        
+        url = self._object_url(s3_key)
+        if stream_logger:
+            stream_logger.log(f"Successfully uploaded {len(parts)} parts to {url}")
+        
+        return {
+            'url': url,
+            'bucket': bucket,
+            'key': s3_key,
+            'isPublic': self.is_public
+        }
+    
+    def _upload_part(self, bucket: str, s3_key: str, upload_id: str, part_number: int, body: bytes) -> Dict[str, Any]:
+        """Upload one part of a multipart upload and return its completion entry"""
+        response = self.s3_client.upload_part(
+            Bucket=bucket,
+            Key=s3_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body
+        )
+        return {'ETag': response['ETag'], 'PartNumber': part_number}
+    
+    def upload_directory(self, root: str, key_prefix: str, stream_logger: Optional[Any] = None) -> Dict[str, Any]:
+        """
+        Upload every file in a directory to the CDN, several files at a time
+        
+        Files are uploaded under '<path>/<key_prefix>/' keeping their paths
+        relative to root, which avoids zipping the directory first. A JSON
+        manifest listing each file's path and URL is then uploaded as
+        '<path>/<key_prefix>.manifest.json'; its URL is the result's url,
+        since the key prefix itself is not a downloadable object.
+        
+        Args:
+            root: Path to the directory to upload
+            key_prefix: Key prefix for this upload within the channel path (e.g. the job ID)
+            stream_logger: Optional LogStream instance for logging progress
+        
+        Returns:
+            dict with keys: url (of the manifest), bucket, key, files, isPublic
+        """
+        if not os.path.isdir(root):
+            raise FileNotFoundError(f"Directory not found: {root}")
+        
+        bucket = self.bucket
+        base_key = self._object_key(key_prefix)
+        
+        manifest: List[Tuple[str, str]] = [
+            (file_path, f"{base_key}/{rel_path}")
+            for file_path, rel_path in _iter_files(root)
+        ]
+        
+        try:
+            if stream_logger:
+                stream_logger.log(f"Uploading {len(manifest)} files from {root} to S3...")
+            
+            with ThreadPoolExecutor(max_workers=_SYNC_MAX_WORKERS, thread_name_prefix="cdn-sync") as executor:
+                futures = [
+                    executor.submit(
+                        self.s3_client.upload_file,
+                        file_path,
+                        bucket,
+                        s3_key,
+                        Config=_SYNC_TRANSFER_CFG,
+                        ExtraArgs=self._extra_args(s3_key, unique_key=True)
+                    )
+                    for file_path, s3_key in manifest
+                ]
+                # Surface the first failure, if any
+                for future in futures:
+                    future.result()
+            
+            # Written last, so the manifest only exists once every file does
+            manifest_key = f"{base_key}.manifest.json"
+            self.s3_client.put_object(
+                Bucket=bucket,
+                Key=manifest_key,
+                Body=dumps({'files': [
+                    {'path': s3_key[len(base_key) + 1:], 'url': self._object_url(s3_key)}
+                    for _, s3_key in manifest
+                ]}),
+                **self._extra_args(manifest_key, unique_key=True)
+            )
+            url = self._object_url(manifest_key)
+            if stream_logger:
+                stream_logger.log(f"Successfully uploaded {len(manifest)} files, manifest at {url}")
+            
+            return {
+                'url': url,
+                'bucket': bucket,
+                'key': base_key,
+                'files': [s3_key for _, s3_key in manifest],
+                'isPublic': self.is_public
             }
         
         # Log any errors that occur during upload
@@ -150,3 +463,46 @@ class CDNUploader:
             if stream_logger:
                 stream_logger.log(f"CDN upload error: {str(e)}", level="error")
             raise
+    
+    def _object_key(self, name: str) -> str:
+        """Build the S3 key for a name within this destination's path prefix"""
+        return posixpath.join(self.path_prefix, name) if self.path_prefix else name
+    
+    def _extra_args(self, file_name: str, unique_key: bool = False) -> Dict[str, str]:
+        """Build the object settings sent with the upload request itself
+        
+        Sets the content type from the file name and the public-read ACL for
+        public objects. Public objects whose key is unique to the job also get
+        a long browser cache lifetime, since that key is never overwritten.
+        """
+        extra_args = {'ContentType': mimetypes.guess_type(file_name)[0] or 'application/octet-stream'}
+        if self.is_public:
+            extra_args['ACL'] = 'public-read'
+            if unique_key:
+                extra_args['CacheControl'] = 'public, max-age=31536000'
+        return extra_args
+    
+    def _object_url(self, s3_key: str) -> str:
+        """Build the public URL of an object in this destination
+        
+        The key is percent-encoded (keeping '/') so names with spaces or
+        non-ASCII characters still produce working links.
+        """
+        return f"{self._url_base}/{quote(s3_key, safe='/')}"
+
+
+def _iter_files(root: str, rel_dir: str = '') -> Iterator[Tuple[str, str]]:
+    """Recursively yield (absolute path, '/'-separated relative path) for files under root
+    
+    Symlinked directories are not descended into, as when zipping a build,
+    so a link to a parent or to '/' cannot loop or leave the build tree.
+    Symlinked files are uploaded with their target's contents.
+    """
+    with os.scandir(os.path.join(root, rel_dir) if rel_dir else root) as entries:
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            if entry.is_dir(follow_symlinks=True):
+                if not entry.is_symlink():
+                    yield from _iter_files(root, rel_path)
+            elif entry.is_file(follow_symlinks=True):
+                yield entry.path, rel_path
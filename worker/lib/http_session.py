@@ -0,0 +1,44 @@
+import threading
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+
+class LazySession:
+    """A requests.Session shared by every thread, created on first call.
+
+    requests is only imported when the session is first needed, so workers
+    that never make the requests it is for do not pay for the import.
+    Connections are pooled and kept alive between calls instead of paying a
+    TCP and TLS handshake each time.
+    """
+
+    def __init__(self, **retry: Any) -> None:
+        """Configure the session without creating it yet.
+
+        Args:
+            **retry: Keyword arguments for the urllib3 Retry policy mounted
+                for https:// requests
+        """
+        self._retry = retry
+        self._session: Optional["requests.Session"] = None
+        self._lock = threading.Lock()
+
+    def __call__(self) -> "requests.Session":
+        """Return the shared session, creating it on first use."""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    from urllib3.util.retry import Retry
+
+                    session = requests.Session()
+                    session.mount('https://', HTTPAdapter(
+                        pool_connections=4,
+                        pool_maxsize=8,
+                        max_retries=Retry(**self._retry)
+                    ))
+                    self._session = session
+        return self._session
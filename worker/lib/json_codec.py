@@ -0,0 +1,26 @@
+import json
+from typing import Any, Union
+
+
+# Job bodies and webhook payloads are encoded with orjson when it is
+# installed. The standard library fallback produces the same compact JSON.
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch
+# json.JSONDecodeError with either backend.
+try:
+    import orjson
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize obj to compact UTF-8 encoded JSON."""
+        return orjson.dumps(obj)
+
+    def loads(data: Union[bytes, str]) -> Any:
+        """Parse JSON from bytes or str."""
+        return orjson.loads(data)
+except ImportError:
+    def dumps(obj: Any) -> bytes:
+        """Serialize obj to compact UTF-8 encoded JSON."""
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def loads(data: Union[bytes, str]) -> Any:
+        """Parse JSON from bytes or str."""
+        return json.loads(data)
@@ -6,10 +6,74 @@ environment variables (SLACK_WEBHOOK_URL and DISCORD_WEBHOOK_URL).
 """
 
 import os
-import requests
-import json
-from typing import Optional, Dict, Any
-from datetime import datetime
+import re
+import calendar
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Optional, Dict, Any, Iterator, List, Tuple
+from datetime import datetime, timedelta, timezone
+
+from lib.http_session import LazySession
+from lib.json_codec import dumps
+
+if TYPE_CHECKING:
+    import requests
+
+
+# Fast path for the 'YYYY-MM-DDTHH:MM:SS[.ffffff][Z]' timestamps written by the worker
+_ISO_RE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(\.\d+)?Z?$')
+
+
+def _iso_epoch_us(match: re.Match) -> int:
+    """Convert a matched _ISO_RE timestamp to whole microseconds since the epoch.
+    
+    Fractions are truncated to microseconds, as datetime.fromisoformat does.
+    """
+    *parts, fraction = match.groups()
+    seconds = calendar.timegm(tuple(int(part) for part in parts) + (0, 0, 0))
+    micros = int(fraction[1:7].ljust(6, '0')) if fraction else 0
+    return seconds * 1_000_000 + micros
+
+
+@functools.lru_cache(maxsize=256)
+def _duration_between(start: str, end: str) -> timedelta:
+    """Return the time between two ISO 8601 timestamps.
+    
+    Results are cached because the same job is formatted once per webhook.
+    Timestamps that do not match the common worker format fall back to
+    datetime.fromisoformat. Both paths read timestamps without an offset as
+    UTC, so a naive and an offset timestamp can still be subtracted.
+    
+    Raises:
+        ValueError: If a timestamp is not ISO 8601
+        TypeError: If a timestamp is not a string
+    """
+    start_match = _ISO_RE.match(start)
+    end_match = _ISO_RE.match(end)
+    if start_match and end_match:
+        return timedelta(microseconds=_iso_epoch_us(end_match) - _iso_epoch_us(start_match))
+    return _parse_utc(end) - _parse_utc(start)
+
+
+def _parse_utc(timestamp: str) -> datetime:
+    """Parse an ISO 8601 timestamp (Z or +00:00 style) as an aware datetime, assuming UTC if it has no offset."""
+    parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+# HTTP session shared by all webhook posts. Transient failures (connection
+# errors, 429 and 5xx responses) are retried with a short backoff; POST must be
+# allowed explicitly.
+_session = LazySession(
+    total=3,
+    connect=2,
+    read=2,
+    backoff_factor=0.2,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(['POST']),
+    raise_on_status=False
+)
 
 
 class NotificationService:
@@ -31,18 +95,27 @@ class NotificationService:
             print(f"✓ Slack notifications enabled")
         if self.discord_webhook:
             print(f"✓ Discord notifications enabled")
+        
+        # Background executor so webhook delivery never blocks job processing
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="notify")
+        self._pending: set = set()
+        self._pending_lock = threading.Lock()
     
 
-    def send_job_notification(self, job: Dict[str, Any], status: str, error: Optional[str] = None) -> None:
+    def send_job_notification(self, job: Dict[str, Any], status: str, error: Optional[str] = None, wait_timeout: Optional[float] = None) -> None:
         """Send notification about job completion or failure to all configured services.
         
         This is the main entry point for sending notifications. It dispatches to
         platform-specific handlers (Discord, Slack) based on configured webhooks.
+        Deliveries to all webhooks run in parallel on a background executor.
+        By default this method returns immediately; call drain() before
+        shutdown to flush pending deliveries.
         
         Args:
             job: Job dictionary with metadata (id, project, platform, services, etc.)
             status: Job status - either 'completed' or 'failed'
             error: Optional error message if job failed, included in notification
+            wait_timeout: If set, wait up to this many seconds for the deliveries
         """
         # Skip if no webhooks are configured
         if not self.slack_webhook and not self.discord_webhook:
@@ -53,13 +126,53 @@ class NotificationService:
         job_id = job.get('id', 'unknown')
         print(f"Sending {status} notification for job {job_id}")
         
-        # Send to Discord if webhook is configured
+        # Hand each configured webhook to the background executor, with one
+        # notification time shared by both payloads. The deliveries get a
+        # shallow copy, so the caller can keep updating the job meanwhile.
+        job = dict(job)
+        sent_at = datetime.now(timezone.utc)
+        futures = []
         if self.discord_webhook:
-            self._send_discord_notification(job, status, error)
-        
-        # Send to Slack if webhook is configured
+            futures.append(self._submit(self._send_discord_notification, job, status, error, sent_at))
         if self.slack_webhook:
-            self._send_slack_notification(job, status, error)
+            futures.append(self._submit(self._send_slack_notification, job, status, error, sent_at))
+        
+        # Optionally block until both deliveries finish (max of the two round trips)
+        if wait_timeout is not None:
+            wait(futures, timeout=wait_timeout)
+    
+
+    def drain(self, timeout: Optional[float] = 30) -> None:
+        """Wait for pending notifications to be delivered and stop the executor.
+        
+        Intended to be called once at worker shutdown.
+        
+        Args:
+            timeout: Maximum number of seconds to wait for pending deliveries
+        """
+        with self._pending_lock:
+            pending = list(self._pending)
+        _, not_done = wait(pending, timeout=timeout)
+        if not_done:
+            print(f"{len(not_done)} notification(s) still pending at shutdown")
+        self._executor.shutdown(wait=False)
+    
+
+    def _submit(self, fn, *args) -> Future:
+        """Submit a delivery to the executor and track it until it completes."""
+        future = self._executor.submit(fn, *args)
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._on_done)
+        return future
+    
+
+    def _on_done(self, future: Future) -> None:
+        """Forget a finished delivery and report any unexpected error."""
+        with self._pending_lock:
+            self._pending.discard(future)
+        if future.exception():
+            print(f"Error sending notification: {str(future.exception())}")
     
 
     def _format_duration(self, start: str, end: str) -> str:
@@ -76,15 +189,12 @@ class NotificationService:
             Formatted duration string (e.g. "2m 5s", "1h 15m 30s"), or "N/A" on error
         """
         try:
-            # Parse ISO 8601 timestamps, handling both Z and +00:00 timezone formats
-            start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
-            end_dt = datetime.fromisoformat(end.replace('Z', '+00:00'))
-            delta = end_dt - start_dt
+            delta = _duration_between(start, end)
             
-            # Calculate hours, minutes, and seconds from the time delta
-            hours = delta.seconds // 3600
-            minutes = (delta.seconds % 3600) // 60
-            seconds = delta.seconds % 60
+            # Calculate hours, minutes, and seconds from the whole time delta
+            # (delta.seconds alone drops full days from runs over 24 hours)
+            hours, remainder = divmod(int(delta.total_seconds()), 3600)
+            minutes, seconds = divmod(remainder, 60)
             
             # Format as human-readable string, omitting zero values
             if hours > 0:
@@ -98,7 +208,84 @@ class NotificationService:
             return "N/A"
     
     
-    def _send_discord_notification(self, job: Dict[str, Any], status: str, error: Optional[str] = None) -> None:
+    def _iter_field_specs(self, job: Dict[str, Any], error: Optional[str], markdown: bool) -> Iterator[Tuple[str, str, bool]]:
+        """Yield (name, value, inline) for each field shown in a notification.
+        
+        Shared by the Discord and Slack formatters so both report the same facts.
+        
+        Args:
+            job: Job dictionary with full metadata (id, project, platform, services, etc.)
+            error: Optional error message if job failed
+            markdown: Whether values may use Discord-style markdown (code spans, links)
+        
+        Yields:
+            Tuples of field name, field value and whether the field is displayed inline
+        """
+        # Basic job information (inline fields for compact display)
+        yield 'Project', job.get('project', 'N/A'), True
+        yield 'Platform', job.get('platform', 'N/A'), True
+        yield 'Source', job.get('source', 'N/A'), True
+        
+        # Distribution services (CDN, Steam, etc.)
+        services = job.get('services', [])
+        yield 'Services', ', '.join(services) if services else 'N/A', True
+        
+        # Execution duration if available
+        if job.get('startedAt') and job.get('completedAt'):
+            yield 'Distribution Time', self._format_duration(job['startedAt'], job['completedAt']), True
+        
+        # Unique job identifier (full width field)
+        job_id = job.get('id', 'N/A')
+        yield 'Job ID', f"`{job_id}`" if markdown else job_id, False
+        
+        # CDN URL, as a clickable download link where markdown is supported
+        if job.get('cdnUrl'):
+            yield 'CDN URL', f"[Download]({job['cdnUrl']})" if markdown else job['cdnUrl'], False
+        
+        # Steam upload results if available (build ID and branch)
+        steam_result = job.get('steam_result', {})
+        if steam_result.get('build_id'):
+            code = '`' if markdown else ''
+            steam_info = f"Build ID: {code}{steam_result['build_id']}{code}"
+            if steam_result.get('branch_set'):
+                steam_info += f"\nBranch: {code}{steam_result['branch_set']}{code}"
+            yield 'Steam Upload', steam_info, False
+        
+        # Error message if job failed (full width field)
+        if error:
+            yield 'Error', error, False
+    
+    
+    def _build_fields(self, job: Dict[str, Any], error: Optional[str], name_key: str, inline_key: str, markdown: bool) -> List[Dict[str, Any]]:
+        """Build the list of field objects for a webhook payload.
+        
+        Args:
+            job: Job dictionary with full metadata
+            error: Optional error message if job failed
+            name_key: Key used for the field name ('name' for Discord, 'title' for Slack)
+            inline_key: Key used for the inline flag ('inline' for Discord, 'short' for Slack)
+            markdown: Whether values may use Discord-style markdown
+        
+        Returns:
+            List of field dictionaries
+        """
+        return [
+            {name_key: name, 'value': value, inline_key: inline}
+            for name, value, inline in self._iter_field_specs(job, error, markdown)
+        ]
+    
+    
+    def _post_json(self, url: str, message: Dict[str, Any]) -> "requests.Response":
+        """POST a compactly serialized JSON payload to a webhook (1s connect / 5s read timeout)."""
+        return _session().post(
+            url,
+            data=dumps(message),
+            headers={'Content-Type': 'application/json'},
+            timeout=(1, 5)
+        )
+    
+    
+    def _send_discord_notification(self, job: Dict[str, Any], status: str, error: Optional[str] = None, sent_at: Optional[datetime] = None) -> None:
         """Send formatted notification to Discord webhook via rich embed.
         
         Creates a Discord embed message with job metadata, status, and results.
@@ -108,6 +295,7 @@ class NotificationService:
             job: Job dictionary with full metadata (id, project, platform, services, etc.)
             status: Job status - 'completed' or 'failed'
             error: Optional error message if job failed
+            sent_at: Time of the notification (default: now, in UTC)
         """
         try:
             if not self.discord_webhook:
@@ -115,79 +303,11 @@ class NotificationService:
             
             # Determine embed color based on status (green for success, red for failure)
             is_success = status == 'completed'
+            sent_at = sent_at or datetime.now(timezone.utc)
             color = 3381519 if is_success else 13632211  # 0x33A64F : 0xD32F2F
             
             # Build embed fields array with job metadata
-            fields = []
-            
-            # Add basic job information (inline fields for compact display)
-            fields.append({
-                'name': 'Project',
-                'value': job.get('project', 'N/A'),
-                'inline': True
-            })
-            fields.append({
-                'name': 'Platform',
-                'value': job.get('platform', 'N/A'),
-                'inline': True
-            })
-            fields.append({
-                'name': 'Source',
-                'value': job.get('source', 'N/A'),
-                'inline': True
-            })
-            
-            # Add distribution services (CDN, Steam, etc.)
-            services = job.get('services', [])
-            fields.append({
-                'name': 'Services',
-                'value': ', '.join(services) if services else 'N/A',
-                'inline': True
-            })
-            
-            # Add execution duration if available
-            if job.get('startedAt') and job.get('completedAt'):
-                duration = self._format_duration(job['startedAt'], job['completedAt'])
-                fields.append({
-                    'name': 'Distribution Time',
-                    'value': duration,
-                    'inline': True
-                })
-            
-            # Add unique job identifier (full width field)
-            fields.append({
-                'name': 'Job ID',
-                'value': f"`{job.get('id', 'N/A')}`",
-                'inline': False
-            })
-            
-            # Add CDN URL with clickable download link if available
-            if job.get('cdnUrl'):
-                fields.append({
-                    'name': 'CDN URL',
-                    'value': f"[Download]({job['cdnUrl']})",
-                    'inline': False
-                })
-            
-            # Add Steam upload results if available (build ID and branch)
-            steam_result = job.get('steam_result', {})
-            if steam_result.get('build_id'):
-                steam_field = f"Build ID: `{steam_result['build_id']}`"
-                if steam_result.get('branch_set'):
-                    steam_field += f"\nBranch: `{steam_result['branch_set']}`"
-                fields.append({
-                    'name': 'Steam Upload',
-                    'value': steam_field,
-                    'inline': False
-                })
-            
-            # Add error message if job failed
-            if error:
-                fields.append({
-                    'name': 'Error',
-                    'value': error,
-                    'inline': False
-                })
+            fields = self._build_fields(job, error, 'name', 'inline', markdown=True)
             
             # Build Discord webhook message with rich embed
             title = f"Build Distribution {status.title()}: {job.get('project', 'Unknown')}"
@@ -198,24 +318,22 @@ class NotificationService:
                         'title': title,
                         'color': color,
                         'fields': fields,
-                        'timestamp': job.get('completedAt', datetime.utcnow().isoformat() + 'Z')
+                        'timestamp': job.get('completedAt') or sent_at.isoformat().replace('+00:00', 'Z')
                     }
                 ]
             }
             
-            # Send webhook request with 10 second timeout
-            response = requests.post(self.discord_webhook, json=message, timeout=10)
+            # Send webhook request
+            response = self._post_json(self.discord_webhook, message)
             if response.status_code >= 400:
                 print(f"Discord webhook error: {response.status_code} - {response.text}")
             else:
                 print("Discord notification sent successfully")
         except Exception as e:
             print(f"Error sending Discord notification: {str(e)}")
-            import traceback
-            traceback.print_exc()
     
     
-    def _send_slack_notification(self, job: Dict[str, Any], status: str, error: Optional[str] = None) -> None:
+    def _send_slack_notification(self, job: Dict[str, Any], status: str, error: Optional[str] = None, sent_at: Optional[datetime] = None) -> None:
         """Send formatted notification to Slack webhook via attachment.
         
         Creates a Slack message attachment with job metadata, status, and results.
@@ -225,6 +343,7 @@ class NotificationService:
             job: Job dictionary with full metadata (id, project, platform, services, etc.)
             status: Job status - 'completed' or 'failed'
             error: Optional error message if job failed
+            sent_at: Time of the notification (default: now, in UTC)
         """
         try:
             if not self.slack_webhook:
@@ -232,79 +351,11 @@ class NotificationService:
             
             # Determine attachment color based on status (green for success, red for failure)
             is_success = status == 'completed'
+            sent_at = sent_at or datetime.now(timezone.utc)
             color = '#36a64f' if is_success else '#d32f2f'  # Green : Red
             
             # Build attachment fields array with job metadata
-            fields = []
-            
-            # Add basic job information (short fields for 2-column layout)
-            fields.append({
-                'title': 'Project',
-                'value': job.get('project', 'N/A'),
-                'short': True
-            })
-            fields.append({
-                'title': 'Platform',
-                'value': job.get('platform', 'N/A'),
-                'short': True
-            })
-            fields.append({
-                'title': 'Source',
-                'value': job.get('source', 'N/A'),
-                'short': True
-            })
-            
-            # Add distribution services (CDN, Steam, etc.)
-            services = job.get('services', [])
-            fields.append({
-                'title': 'Services',
-                'value': ', '.join(services) if services else 'N/A',
-                'short': True
-            })
-            
-            # Add execution duration if available
-            if job.get('startedAt') and job.get('completedAt'):
-                duration = self._format_duration(job['startedAt'], job['completedAt'])
-                fields.append({
-                    'title': 'Distribution Time',
-                    'value': duration,
-                    'short': True
-                })
-            
-            # Add unique job identifier (full width field)
-            fields.append({
-                'title': 'Job ID',
-                'value': job.get('id', 'N/A'),
-                'short': False
-            })
-            
-            # Add CDN URL if available (full width field)
-            if job.get('cdnUrl'):
-                fields.append({
-                    'title': 'CDN URL',
-                    'value': job['cdnUrl'],
-                    'short': False
-                })
-            
-            # Add Steam upload results if available (build ID and branch)
-            steam_result = job.get('steam_result', {})
-            if steam_result.get('build_id'):
-                steam_info = f"Build ID: {steam_result['build_id']}"
-                if steam_result.get('branch_set'):
-                    steam_info += f"\nBranch: {steam_result['branch_set']}"
-                fields.append({
-                    'title': 'Steam Upload',
-                    'value': steam_info,
-                    'short': False
-                })
-            
-            # Add error message if job failed (full width field)
-            if error:
-                fields.append({
-                    'title': 'Error',
-                    'value': error,
-                    'short': False
-                })
+            fields = self._build_fields(job, error, 'title', 'short', markdown=False)
             
             # Build Slack webhook message with colored attachment
             message = {
@@ -313,13 +364,13 @@ class NotificationService:
                         'color': color,
                         'title': f"Build Distribution {status.title()}: {job.get('project', 'Unknown')}",
                         'fields': fields,
-                        'ts': int(datetime.utcnow().timestamp())
+                        'ts': int(sent_at.timestamp())
                     }
                 ]
             }
             
-            # Send webhook request with 10 second timeout
-            response = requests.post(self.slack_webhook, json=message, timeout=10)
+            # Send webhook request
+            response = self._post_json(self.slack_webhook, message)
             if response.status_code >= 400:
                 print(f"Slack webhook error: {response.status_code} - {response.text}")
             else:
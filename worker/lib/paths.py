@@ -0,0 +1,29 @@
+import os
+import stat
+from typing import Optional
+
+
+def classify_path(path: Optional[str]) -> Optional[str]:
+    """Stat a build path once and report what it is.
+    
+    Args:
+        path: Path to check (None is treated as missing)
+    
+    Returns:
+        'file', 'dir' or 'other', or None if the path does not exist
+    
+    Raises:
+        OSError: If the path exists but cannot be stat'ed (e.g. permission
+            denied, I/O error or a symlink loop)
+    """
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    if stat.S_ISREG(st.st_mode):
+        return 'file'
+    if stat.S_ISDIR(st.st_mode):
+        return 'dir'
+    return 'other'
@@ -0,0 +1,36 @@
+import os
+import socket
+import redis
+
+
+# Idle seconds before the first TCP keepalive probe, probe interval and probe
+# count, where the platform supports setting them
+_KEEPALIVE_OPTIONS = {
+    getattr(socket, name): value
+    for name, value in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3))
+    if hasattr(socket, name)
+}
+
+# Connection pool shared by every Valkey client in the worker (job queues and
+# job log streams), built once from the environment. Replies are left as bytes:
+# job bodies go straight to the JSON parser, which accepts bytes, so decoding
+# them to str first would only cost CPU and a copy.
+# Connections speak RESP3 (HELLO 3, Valkey/Redis 6+), whose typed replies are
+# cheaper to parse than RESP2's; every reply the worker reads unpacks the same.
+# Connections are long-lived so TLS handshakes stay off the job path. Keepalives
+# stop idle connections being dropped by NATs and load balancers, and one idle
+# longer than the health check interval is PINGed before reuse, so a dead
+# connection is replaced instead of failing a command. No socket timeout is set
+# because the worker blocks on BLPOP/BLMPOP until a job arrives.
+_use_ssl = os.environ.get("VALKEY_USE_SSL", "false").lower() == "true"
+POOL: redis.ConnectionPool = redis.ConnectionPool(
+    connection_class=redis.SSLConnection if _use_ssl else redis.Connection,
+    host=os.environ.get("VALKEY_HOST", "valkey"),
+    port=int(os.environ.get("VALKEY_PORT", 6379)),
+    password=os.environ.get("VALKEY_PASSWORD", "change_in_production"),
+    max_connections=64,
+    protocol=3,
+    socket_keepalive=True,
+    socket_keepalive_options=_KEEPALIVE_OPTIONS,
+    health_check_interval=30,
+)
@@ -1,11 +1,15 @@
 """Steam VDF configuration builder for SteamPipe uploads."""
 
 import os
+import tempfile
 from typing import Optional
 from lib.streams import LogStream
 from .templates import VDF_TEMPLATE, DEPOT_TEMPLATE
 
 
+# VDF template split around the depot sections, which are written one at a time
+_VDF_HEAD, _VDF_TAIL = VDF_TEMPLATE.rsplit('%s', 1)
+
 # ===============================================================
 # VDF Configuration Builder
 # ===============================================================
@@ -37,7 +41,8 @@ class SteamVDFBuilder:
             branch: Optional branch name to set live on
         
         Returns:
-            Path to the generated VDF file at /tmp/{app_id}_build.vdf
+            Path to the generated VDF file, a uniquely named file in TEMP_BUILD_PATH.
+            The caller is responsible for removing it after the upload.
         
         Raises:
             ValueError: If VDF generation fails
@@ -45,40 +50,30 @@ class SteamVDFBuilder:
         try:
             self.stream.log(f"Generating SteamPipe VDF for app {self.app_id}...")
             
-            # Build depot sections from configuration
-            depot_sections = []
-            for depot in self.depots:
-                depot_id = depot.get('id')
-                depot_path = depot.get('path', '.')
-                content_root = f"{build_path}/{depot_path}"
-                
-                depot_content = DEPOT_TEMPLATE.format(
-                    depot_id=depot_id,
-                    content_root=content_root
-                )
-                depot_sections.append(depot_content)
-            
-            # Join depot sections with newlines for readability
-            depots_str = '\n'.join(depot_sections)
-            
             # Use provided description or default
             desc = description if description else 'Build from BuildRelay'
             
             # Add SetLive parameter if branch is specified
             set_live_str = f'    \"SetLive\" \"{branch}\"\n' if branch else ''
             
-            # Fill main VDF template with all values
-            vdf_content = VDF_TEMPLATE.format(
-                app_id=self.app_id,
-                depots=depots_str,
-                description=desc,
-                set_live=set_live_str
+            # Write VDF file to the temp build directory, with a unique name so
+            # channels or jobs uploading the same app at once do not overwrite
+            # each other. Depot sections are written straight to the file as
+            # they are formatted instead of being joined into one string first.
+            temp_path = os.environ.get("TEMP_BUILD_PATH", "/tmp")
+            os.makedirs(temp_path, exist_ok=True)
+            fd, vdf_path = tempfile.mkstemp(
+                prefix=f"{self.app_id}_",
+                suffix="_build.vdf",
+                dir=temp_path
             )
-            
-            # Write VDF file to temp directory
-            vdf_path = f"/tmp/{self.app_id}_build.vdf"
-            with open(vdf_path, 'w') as f:
-                f.write(vdf_content)
+            with os.fdopen(fd, 'w') as f:
+                f.write(_VDF_HEAD % (self.app_id, desc, set_live_str))
+                f.writelines(
+                    ('\n' if i else '') + DEPOT_TEMPLATE % (depot.get('id'), f"{build_path}/{depot.get('path', '.')}")
+                    for i, depot in enumerate(self.depots)
+                )
+                f.write(_VDF_TAIL)
             
             self.stream.log(f"VDF file generated: {vdf_path}")
             return vdf_path
@@ -1,25 +1,27 @@
 """VDF templates for SteamPipe build configuration."""
 
-# VDF Template for SteamPipe builds
-VDF_TEMPLATE = '''\"AppBuild\"
-{{
-    \"AppID\" \"{app_id}\"
-    \"Desc\"  \"{description}\"
-{set_live}
-    \"Depots\"
-    {{
-{depots}
-    }}
-}}'''
+# VDF Template for SteamPipe builds.
+# Positional %-style fields: app ID, description, SetLive line, depot sections
+VDF_TEMPLATE = '''"AppBuild"
+{
+    "AppID" "%s"
+    "Desc"  "%s"
+%s
+    "Depots"
+    {
+%s
+    }
+}'''
 
-DEPOT_TEMPLATE = '''        \"{depot_id}\"
-        {{
-            \"ContentRoot\" \"{content_root}\"
+# Positional %-style fields: depot ID, content root
+DEPOT_TEMPLATE = '''        "%s"
+        {
+            "ContentRoot" "%s"
 
-            \"FileMapping\"
-            {{
-                \"LocalPath\" \"*\"
-                \"DepotPath\" \".\"
-                \"Recursive\" \"1\"
-            }}
-        }}'''
+            "FileMapping"
+            {
+                "LocalPath" "*"
+                "DepotPath" "."
+                "Recursive" "1"
+            }
+        }'''
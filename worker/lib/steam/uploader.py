@@ -1,11 +1,23 @@
 """SteamCMD integration for uploading builds to Steam."""
 
 import os
+import re
 import subprocess
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional
 from lib.streams import LogStream
 
 
+# ANSI escape sequences like [0m, [1m, etc. emitted by SteamCMD. Matched
+# against raw bytes so lines are only decoded once, after stripping.
+_ANSI_RE = re.compile(rb'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
+# Build IDs are logged by SteamCMD as "BuildID 12345"
+_BUILDID_RE = re.compile(r'BuildID\s+(\d+)')
+
+# Number of bytes read from the SteamCMD pipe per system call
+_READ_SIZE = 64 * 1024
+
+
 # ===============================================================
 # SteamCMD Integration
 # ===============================================================
@@ -25,22 +37,85 @@ class SteamUploader:
         """
         self.stream = stream
         self.steam_username = os.environ.get("STEAM_USERNAME", "")
+        # SteamCMD output is logged at info; when that level is filtered out,
+        # lines are only cleaned if they may hold the build ID
+        self._log_lines = stream.enabled("info")
     
-    def _strip_ansi(self, text: str) -> str:
-        """Remove ANSI escape codes from text.
+    def _strip_ansi(self, raw: bytes) -> str:
+        """Remove ANSI escape codes from a raw output line and decode it.
         
         Removes color codes and formatting from SteamCMD output for cleaner logging.
         
         Args:
-            text: Text potentially containing ANSI escape codes
+            raw: Raw bytes of a single line potentially containing ANSI escape codes
+        
+        Returns:
+            Decoded text with ANSI codes and trailing whitespace removed
+        """
+        # Most lines carry no escape codes, so skip the regex for them
+        if b'\x1b' in raw:
+            raw = _ANSI_RE.sub(b'', raw)
+        return raw.rstrip().decode('utf-8', 'replace')
+    
+    def _take_lines(self, buffer: bytearray, final: bool = False) -> List[str]:
+        """Remove complete lines from the output buffer and return them cleaned.
+        
+        Carriage returns are treated as line breaks, matching the universal
+        newline handling of text mode, and blank lines are dropped. An
+        incomplete trailing line is left in the buffer for the next read.
+        When info lines are not logged, only lines mentioning a build ID are
+        cleaned and returned; the rest are dropped before any decoding.
+        
+        Args:
+            buffer: Output read so far and not yet split into lines
+            final: Also return the trailing incomplete line (end of output)
         
         Returns:
-            Text with ANSI codes removed
+            Cleaned lines, in output order
         """
-        # Remove ANSI escape sequences like [0m, [1m, etc.
-        import re
-        ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-        return ansi_escape.sub('', text)
+        end = len(buffer) if final else max(buffer.rfind(b'\n'), buffer.rfind(b'\r')) + 1
+        if not end:
+            return []
+        raw_lines = bytes(buffer[:end]).replace(b'\r', b'\n').split(b'\n')
+        del buffer[:end]
+        if not self._log_lines:
+            raw_lines = [line for line in raw_lines if b'BuildID' in line]
+        return [line for line in map(self._strip_ansi, raw_lines) if line]
+    
+    def _read_lines(self, pipe) -> Iterator[List[str]]:
+        """Yield cleaned lines from a SteamCMD output pipe, one list per read.
+        
+        Reads the pipe in large binary chunks rather than line by line through
+        the text I/O layer, collecting them in a single reusable buffer.
+        
+        Args:
+            pipe: Binary stdout pipe of the SteamCMD process
+        
+        Yields:
+            Complete output lines from each read, with ANSI codes removed
+        """
+        fd = pipe.fileno()
+        buffer = bytearray()
+        while True:
+            chunk = os.read(fd, _READ_SIZE)
+            if not chunk:
+                break
+            buffer += chunk
+            yield self._take_lines(buffer)
+        yield self._take_lines(buffer, final=True)
+    
+    def _log_output(self, lines: List[str]) -> None:
+        """Write a read's worth of SteamCMD output lines to the job log in one call."""
+        if lines and self._log_lines:
+            self.stream.log_many([(line, "info") for line in lines])
+    
+    def _find_build_id(self, lines: List[str]) -> Optional[str]:
+        """Return the build ID from the first of the lines that contains one."""
+        for line in lines:
+            build_id = self._extract_build_id(line)
+            if build_id is not None:
+                return build_id
+        return None
     
     def _extract_build_id(self, output: str) -> Optional[str]:
         """Extract build ID from SteamCMD output.
@@ -54,12 +129,76 @@ class SteamUploader:
         Returns:
             Build ID if found, None otherwise
         """
-        import re
-        # Look for "BuildID 12345" pattern in SteamCMD output
-        match = re.search(r'BuildID\s+(\d+)', output)
-        if match:
-            return match.group(1)
-        return None
+        match = _BUILDID_RE.search(output)
+        return match.group(1) if match else None
+    
+    def _build_command(self, vdf_path: str) -> List[str]:
+        """Build the SteamCMD command line for a VDF upload.
+        
+        Args:
+            vdf_path: Path to the VDF configuration file
+        
+        Returns:
+            Argument list for steamcmd
+        
+        Raises:
+            ValueError: If STEAM_USERNAME is not set
+        """
+        # Validate steam username is set
+        if not self.steam_username:
+            raise ValueError("STEAM_USERNAME environment variable is required")
+        
+        return [
+            'steamcmd',
+            '+login', self.steam_username,
+            '+run_app_build', vdf_path,
+            '+quit'
+        ]
+    
+    def _finish_upload(self, app_id: str, branch: Optional[str], build_id: Optional[str], return_code: int) -> Dict[str, Any]:
+        """Check the SteamCMD exit status and build the upload result.
+        
+        Args:
+            app_id: Steam App ID
+            branch: Optional branch name the build was set live on
+            build_id: Build ID extracted from the output, if any
+            return_code: Exit code of the SteamCMD process
+        
+        Returns:
+            dict with keys: app_id, build_id, branch_set, success, message
+        
+        Raises:
+            Exception: If SteamCMD exited with a non-zero code
+        """
+        # Handle upload failure
+        if return_code != 0:
+            error_msg = f"SteamPipe upload failed with code {return_code}"
+            self.stream.log(error_msg, level="error")
+            raise Exception(error_msg)
+        
+        branch_set = None
+        
+        # Log results
+        if build_id:
+            self.stream.log(f"Extracted Build ID: {build_id}")
+            if branch:
+                self.stream.log(f"Build {build_id} set live on branch '{branch}'")
+                branch_set = branch
+            else:
+                self.stream.log("Build uploaded but not set live on any branch")
+        else:
+            self.stream.log("Warning: Could not extract Build ID from output", level="warning")
+        
+        self.stream.log(f"SteamPipe upload completed successfully for app {app_id}")
+        
+        # Return results
+        return {
+            'app_id': app_id,
+            'build_id': build_id,
+            'branch_set': branch_set,
+            'success': True,
+            'message': 'Build successfully uploaded to Steam'
+        }
     
     def upload_build(self, app_id: str, vdf_path: str, branch: Optional[str] = None) -> Dict[str, Any]:
         """Upload build to Steam using SteamPipe.
@@ -79,76 +218,31 @@ class SteamUploader:
             Exception: If upload fails
         """
         try:
-            # Validate steam username is set
-            if not self.steam_username:
-                raise ValueError("STEAM_USERNAME environment variable is required")
-            
+            cmd = self._build_command(vdf_path)
             self.stream.log(f"Starting SteamPipe upload for app {app_id}...")
             
-            # Build steamcmd command with login and build execution
-            cmd = [
-                'steamcmd',
-                '+login', self.steam_username,
-                '+run_app_build', vdf_path,
-                '+quit'
-            ]
-            
             # Log command (without showing password)
             self.stream.log(f"Executing: steamcmd ...")
             
-            # Run steamcmd with real-time output streaming
+            # Run steamcmd with real-time output streaming. Output is read
+            # directly from the pipe's file descriptor, so it is unbuffered.
             process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1
+                bufsize=0
             )
             
-            # Stream output in real-time and capture for build ID extraction
-            output_lines = []
-            for line in iter(process.stdout.readline, ''):
-                if line:
-                    clean_line = self._strip_ansi(line.rstrip())
-                    self.stream.log(clean_line)
-                    output_lines.append(clean_line)
+            # Stream output in real-time, scanning each line for the build ID
+            # until it is found so the output never has to be kept in memory
+            build_id = None
+            for clean_lines in self._read_lines(process.stdout):
+                self._log_output(clean_lines)
+                if build_id is None:
+                    build_id = self._find_build_id(clean_lines)
             
             # Wait for process completion
-            return_code = process.wait()
-            
-            # Handle upload failure
-            if return_code != 0:
-                error_msg = f"SteamPipe upload failed with code {return_code}"
-                self.stream.log(error_msg, level="error")
-                raise Exception(error_msg)
-            
-            # Extract build ID from captured output
-            full_output = '\n'.join(output_lines)
-            build_id = self._extract_build_id(full_output)
-            
-            branch_set = None
-            
-            # Log results
-            if build_id:
-                self.stream.log(f"Extracted Build ID: {build_id}")
-                if branch:
-                    self.stream.log(f"Build {build_id} set live on branch '{branch}'")
-                    branch_set = branch
-                else:
-                    self.stream.log("Build uploaded but not set live on any branch")
-            else:
-                self.stream.log("Warning: Could not extract Build ID from output", level="warning")
-            
-            self.stream.log(f"SteamPipe upload completed successfully for app {app_id}")
-            
-            # Return results
-            return {
-                'app_id': app_id,
-                'build_id': build_id,
-                'branch_set': branch_set,
-                'success': True,
-                'message': 'Build successfully uploaded to Steam'
-            }
+            return self._finish_upload(app_id, branch, build_id, process.wait())
         
         except Exception as e:
             self.stream.log(f"Steam upload error: {str(e)}", level="error")
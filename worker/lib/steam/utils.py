@@ -1,15 +1,22 @@
 """Utilities for Steam build preparation and multi-channel upload orchestration."""
 
 import os
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from lib.paths import classify_path
 from lib.streams import LogStream
 from lib.zip import unzip_build
 from .builder import SteamVDFBuilder
 from .uploader import SteamUploader
 
 
+# Number of Steam channels uploaded at once. SteamCMD instances share the
+# cached login and content in /root/Steam, so this defaults to one; raise it
+# only if concurrent SteamCMD runs are known to work for your setup.
+STEAM_PARALLEL = max(1, int(os.environ.get("STEAM_PARALLEL", "1")))
 
-def prepare_steam_build(job: Dict[str, Any], stream: LogStream) -> str:
+
+def prepare_steam_build(job: Dict[str, Any], stream: LogStream, path_kind: Optional[str] = None) -> str:
     """Prepare build directory for Steam upload (unzip if needed).
     
     Determines if the ingest path is a file or directory and prepares it for
@@ -19,31 +26,42 @@ def prepare_steam_build(job: Dict[str, Any], stream: LogStream) -> str:
     Args:
         job: The job dictionary containing ingest path information
         stream: LogStream instance for logging progress
+        path_kind: classify_path result for the ingest path, if already known
     
     Returns:
         Path to the directory containing the build for Steam upload
     
     Raises:
-        Exception: If the path does not exist or unzip fails
+        FileNotFoundError: If the path does not exist
+        OSError: If the path exists but cannot be stat'ed
+        Exception: If the path is not a file or directory, or unzip fails
     """
     absolute_build_path: Optional[str] = job.get("absoluteIngestPath")
     stream.log(f"Preparing build for Steam upload from {job['ingestPath']}...")
 
-    # Validate path exists
-    if not absolute_build_path or not os.path.exists(absolute_build_path):
+    # Validate path exists, statting it once (unless the caller already has)
+    if path_kind is None:
+        try:
+            path_kind = classify_path(absolute_build_path)
+        except OSError as e:
+            stream.log(f"Cannot access build path {absolute_build_path}: {e.strerror}", level="error")
+            raise
+    if path_kind is None:
         stream.log(f"Path does not exist: {absolute_build_path}", level="error")
-        raise Exception(f"Build path does not exist: {absolute_build_path}")
+        raise FileNotFoundError(f"Build path does not exist: {absolute_build_path}")
     
     # If already a directory, return as-is
-    if os.path.isdir(absolute_build_path):
+    if path_kind == 'dir':
         stream.log(f"Found directory: {absolute_build_path}")
         return absolute_build_path
     
     # If a file, check if it's a zip and extract if needed
-    elif os.path.isfile(absolute_build_path):
-        if absolute_build_path.lower().endswith('.zip'):
+    elif path_kind == 'file':
+        if absolute_build_path[-4:].lower() == '.zip':
             stream.log(f"Found zip file: {absolute_build_path}, extracting to temp directory...")
-            return unzip_build(absolute_build_path, job['id'], stream)
+            # A downloaded Unity Cloud artifact is deleted after the job, so
+            # its extraction could never be reused from the cache
+            return unzip_build(absolute_build_path, job['id'], stream, cache=job.get("source") != "unity-cloud")
         else:
             # Single non-zip file, use parent directory
             stream.log(f"Found single file (not zip): {absolute_build_path}, using parent directory")
@@ -53,12 +71,75 @@ def prepare_steam_build(job: Dict[str, Any], stream: LogStream) -> str:
 
 
 
+def _upload_channel(job: Dict[str, Any], channel: Dict[str, Any], file_path: str, stream: LogStream) -> Dict[str, Any]:
+    """Generate the VDF for one Steam channel and upload the build with it.
+    
+    Args:
+        job: The job dictionary (used for the build description)
+        channel: Steam channel configuration with appId, depots and optional branch
+        file_path: Path to the prepared build directory
+        stream: LogStream instance for logging progress
+    
+    Returns:
+        dict with keys: channel, app_id, result
+    
+    Raises:
+        Exception: If VDF generation or the upload fails
+    """
+    # Extract channel configuration (validated by _validate_channels)
+    label: Optional[str] = channel.get("label")
+    app_id: str = channel["appId"]
+    depots: list = channel["depots"]
+    branch: Optional[str] = channel.get("branch")
+    stream.log(f"Preparing Steam upload to channel '{label}' for app {app_id}...")
+    
+    # Generate VDF configuration file for this channel
+    vdf_builder = SteamVDFBuilder(app_id, depots, stream)
+    vdf_path: str = vdf_builder.build_vdf(file_path, job.get("description"), branch)
+    
+    # Upload build to Steam using generated VDF, then remove it so VDF
+    # files do not accumulate over the life of the worker
+    try:
+        uploader = SteamUploader(stream)
+        result = uploader.upload_build(app_id, vdf_path, branch)
+    finally:
+        try:
+            os.remove(vdf_path)
+        except OSError:
+            pass
+    
+    return {
+        "channel": label,
+        "app_id": app_id,
+        "result": result
+    }
+
+
+def _validate_channels(steam_channels: List[Dict[str, Any]]) -> None:
+    """Check every Steam channel before any upload starts.
+    
+    Raises:
+        ValueError: If a channel is missing its app ID or depots
+    """
+    for channel in steam_channels:
+        if not channel.get("appId") or not channel.get("depots"):
+            raise ValueError(f"Steam channel '{channel.get('label')}' must include 'appId' and 'depots'")
+
+
+def _upload_key(channel: Dict[str, Any]) -> tuple:
+    """Return what makes a Steam channel's upload distinct: app, depots and branch."""
+    depots = tuple(sorted((str(depot.get('id')), depot.get('path', '.')) for depot in channel.get("depots", [])))
+    return (channel.get("appId"), depots, channel.get("branch"))
+
+
 def handle_steam_upload(job: Dict[str, Any], file_path: str, stream: LogStream) -> Dict[str, Any]:
     """Handle Steam build uploads for all configured Steam channels.
     
     Orchestrates the complete Steam upload process for multiple channels.
     For each channel: generates VDF config, uploads via SteamCMD, and tracks results.
-    All channels share the same prepared build to avoid redundant operations.
+    All channels share the same prepared build to avoid redundant operations,
+    and channels with the same app, depots and branch share a single upload.
+    Up to STEAM_PARALLEL uploads run at the same time.
     
     Args:
         job: The job dictionary containing steam_channels array with app IDs and depots
@@ -69,6 +150,7 @@ def handle_steam_upload(job: Dict[str, Any], file_path: str, stream: LogStream)
         dict with keys: success (bool), channels_uploaded (int)
     
     Raises:
+        ValueError: If any channel is missing its app ID or depots
         Exception: If any Steam upload fails
     """
     steam_channels: list = job.get("steam_channels", [])
@@ -78,36 +160,29 @@ def handle_steam_upload(job: Dict[str, Any], file_path: str, stream: LogStream)
         stream.log("No Steam channels configured for this job", level="warning")
         return {"success": False, "message": "No Steam channels configured"}
     
-    results = []
-    
     try:
-        # Process each Steam channel
+        # Fail before anything is uploaded if any channel is misconfigured
+        _validate_channels(steam_channels)
+        
+        # Channels that would upload identical builds share one upload
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
         for channel in steam_channels:
-            stream.log(f"Preparing Steam upload to channel '{channel.get('label')}' for app {channel.get('appId')}...")
-            
-            # Extract channel configuration
-            app_id: str = channel.get("appId")
-            depots: list = channel.get("depots", [])
-            branch: Optional[str] = channel.get("branch")
-            
-            # Validate required fields
-            if not app_id or not depots:
-                raise ValueError(f"Steam channel '{channel.get('label')}' must include 'appId' and 'depots'")
-            
-            # Generate VDF configuration file for this channel
-            vdf_builder = SteamVDFBuilder(app_id, depots, stream)
-            vdf_path: str = vdf_builder.build_vdf(file_path, job.get("description"), branch)
-            
-            # Upload build to Steam using generated VDF
-            uploader = SteamUploader(stream)
-            result = uploader.upload_build(app_id, vdf_path, branch)
-            
-            # Track result for this channel
-            results.append({
-                "channel": channel.get("label"),
-                "app_id": app_id,
-                "result": result
-            })
+            groups.setdefault(_upload_key(channel), []).append(channel)
+        for first, *duplicates in groups.values():
+            for channel in duplicates:
+                stream.log(f"Steam channel '{channel.get('label')}' matches '{first.get('label')}', sharing its upload")
+        
+        # SteamCMD runs as a subprocess, so threads are enough to overlap the uploads
+        with ThreadPoolExecutor(max_workers=min(STEAM_PARALLEL, len(groups)), thread_name_prefix="steam") as executor:
+            futures = {
+                key: executor.submit(_upload_channel, job, group[0], file_path, stream)
+                for key, group in groups.items()
+            }
+            # Collect results in channel order, raising the first failure
+            results = [
+                dict(futures[_upload_key(channel)].result(), channel=channel.get("label"))
+                for channel in steam_channels
+            ]
         
         # Store results in job object
         job["steam_results"] = results
@@ -1,34 +1,229 @@
 
-from datetime import datetime
 import os
+import sys
+import time
+import queue
+import threading
 import redis
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+from lib.redis_pool import POOL
+
+
+# Log lines are sent to Valkey in pipelined batches of up to this many lines
+_BATCH_SIZE = max(1, int(os.environ.get("LOG_BATCH", "64")))
+
+# Most log() or log_many() calls waiting to be sent per stream; callers block beyond this
+_QUEUE_SIZE = 10_000
+
+# Approximate number of entries kept per job stream
+_STREAM_MAXLEN = max(1, int(os.environ.get("LOG_STREAM_MAXLEN", "100000")))
+
+# Level code stored with each entry and its severity, by level name.
+# Unknown level names are logged as info. Debug lines are below the default
+# minimum, so they are only sent when LOG_MIN_LEVEL=debug.
+_LEVELS = {
+    "debug": ("d", -1),
+    "info": ("i", 0),
+    "success": ("s", 0),
+    "warn": ("w", 1),
+    "warning": ("w", 1),
+    "error": ("e", 2),
+}
+_INFO = _LEVELS["info"]
+
+# Lines below LOG_MIN_LEVEL (debug, info, warning or error) are dropped before
+# anything is formatted or sent
+_MIN_SEVERITY = _LEVELS.get(os.environ.get("LOG_MIN_LEVEL", "info").lower(), _INFO)[1]
+
+# Valkey client shared by every LogStream. It draws from the worker-wide
+# pool, so job streams reuse the same connections as the job queues.
+_REDIS: redis.Redis = redis.Redis(connection_pool=POOL)
+
+# Formatted local date and time of the current second, shared by all streams
+_ts_cache = (-1, "")
+
+
+def _timestamp(now: float) -> str:
+    """Format a time.time() value as local time in ISO 8601 with microseconds.
+
+    Matches datetime.now().isoformat(), but the date and time part is only
+    formatted once per second.
+    """
+    global _ts_cache
+    second = int(now)
+    cached_second, prefix = _ts_cache
+    if second != cached_second:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(second))
+        _ts_cache = (second, prefix)
+    return f"{prefix}.{int((now - second) * 1_000_000):06d}"
 
 
 class LogStream():
-    """A logging stream that writes log entries to a Redis stream."""
+    """A logging stream that writes log entries to a Redis stream.
+
+    log() only queues the entry. A background thread sends queued entries in
+    pipelined batches, so job code never waits on a Valkey round trip. Call
+    flush() to wait until queued lines are written, and close() (or use the
+    stream as a context manager) when the job is done.
+    """
 
     def __init__(self, stream_name: str) -> None:
         self.stream_name: str = stream_name
 
-        # Connect to Valkey
-        use_ssl = os.environ.get("VALKEY_USE_SSL", "false").lower() == "true"
-        self.redis_client: redis.Redis = redis.Redis(
-            host=os.environ.get("VALKEY_HOST", "valkey"),
-            port=int(os.environ.get("VALKEY_PORT", 6379)),
-            password=os.environ.get("VALKEY_PASSWORD", "change_in_production"),
-            ssl=use_ssl,
-            decode_responses=True, 
-        )
-
-    # Log a line to the stream    
+        # Connect to Valkey through the shared client
+        self.redis_client: redis.Redis = _REDIS
+
+        # Queued entries and the background thread that sends them
+        self._queue: queue.Queue = queue.Queue(maxsize=_QUEUE_SIZE)
+        self._closed = False
+        # Holders from get_log_stream; the stream is closed when the last one closes it
+        self._users = 1
+        self._sender = threading.Thread(target=self._drain, name=f"log-{stream_name}", daemon=True)
+        self._sender.start()
+
+    def __enter__(self) -> "LogStream":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def enabled(self, level: str) -> bool:
+        """Return True if lines at this level are written rather than dropped.
+
+        Lets callers skip building lines that log() would discard anyway.
+        """
+        return _LEVELS.get(level, _INFO)[1] >= _MIN_SEVERITY
+
+    # Log a line to the stream
     def log(self, line: str, level: str = "info") -> None:
-        """Log a line to the Redis stream."""
-        self.redis_client.xadd(
-            self.stream_name,
-            {
-                "line": line,
-                "timestamp": datetime.now().isoformat(),
-                "level": level[0].lower()
-            },
-        )
+        """Queue a line to be written to the Redis stream.
+
+        Lines logged after close() are dropped, since no thread is left to send them.
+        """
+        code, severity = _LEVELS.get(level, _INFO)
+        if severity < _MIN_SEVERITY or self._closed:
+            return
+        # Only the raw time is taken here; the sender thread formats it.
+        # Blocks only if the sender has fallen _QUEUE_SIZE calls behind,
+        # so lines are slowed down rather than dropped.
+        self._queue.put([(line, time.time(), code)])
+
+    def log_many(self, lines: List[Tuple[str, str]]) -> None:
+        """Queue several lines to be written to the Redis stream at once.
+
+        Each line is still written as its own stream entry, but the whole
+        burst is queued in one step and sent in the same pipelined batch.
+
+        Lines logged after close() are dropped, as with log().
+
+        Args:
+            lines: (line, level) pairs, in output order
+        """
+        if self._closed:
+            return
+        now = time.time()
+        records = []
+        for line, level in lines:
+            code, severity = _LEVELS.get(level, _INFO)
+            if severity >= _MIN_SEVERITY:
+                records.append((line, now, code))
+        if records:
+            self._queue.put(records)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued line has been sent.
+
+        Args:
+            timeout: Maximum number of seconds to wait (default: no limit)
+
+        Returns:
+            True if the queue was fully sent, False if the timeout expired
+        """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def close(self) -> None:
+        """Send any remaining lines and stop the background thread.
+
+        A stream shared through get_log_stream stays open until every holder
+        has closed it.
+        """
+        with _OPEN_LOCK:
+            if self._closed:
+                return
+            self._users -= 1
+            if self._users:
+                return
+            self._closed = True
+            if _OPEN_STREAMS.get(self.stream_name) is self:
+                del _OPEN_STREAMS[self.stream_name]
+        self._queue.put(None)
+        self._sender.join()
+
+    def _drain(self) -> None:
+        """Send queued entries in pipelined batches of up to _BATCH_SIZE until closed.
+
+        Waits for the first entry, then takes whatever else is already queued,
+        so lines that pile up while a batch is in flight go out together.
+        Each queued item is a list of records from one log() or log_many() call.
+        """
+        while True:
+            entries = [self._queue.get()]
+            records = list(entries[0] or ())
+            while len(records) < _BATCH_SIZE:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                entries.append(entry)
+                records.extend(entry or ())
+
+            try:
+                # A large log_many() burst is still split into _BATCH_SIZE pipelines
+                for start in range(0, len(records), _BATCH_SIZE):
+                    # Trim once per batch rather than on every XADD
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    for line, logged_at, code in records[start:start + _BATCH_SIZE]:
+                        pipe.xadd(self.stream_name, {
+                            "line": line,
+                            "timestamp": _timestamp(logged_at),
+                            "level": code
+                        })
+                    pipe.xtrim(self.stream_name, maxlen=_STREAM_MAXLEN, approximate=True)
+                    pipe.execute()
+            except Exception as e:
+                print(f"Error writing to log stream {self.stream_name}: {str(e)}", file=sys.stderr)
+            finally:
+                for _ in entries:
+                    self._queue.task_done()
+
+            # close() queues None after the last line
+            if entries[-1] is None:
+                return
+
+
+# Open streams by name, so code paths logging to the same stream share one
+# LogStream (and its sender thread) instead of each starting their own
+_OPEN_STREAMS: Dict[str, LogStream] = {}
+_OPEN_LOCK = threading.Lock()
+
+
+def get_log_stream(stream_name: str) -> LogStream:
+    """Return the open LogStream for a stream name, creating it if needed.
+
+    Each call must be matched by a close() (or a with block). Closed streams
+    are never returned; the next call after the last close starts a new one.
+
+    Args:
+        stream_name: Valkey stream key, e.g. 'job_stream:<job id>'
+
+    Returns:
+        The shared LogStream for stream_name
+    """
+    with _OPEN_LOCK:
+        stream = _OPEN_STREAMS.get(stream_name)
+        if stream is not None:
+            stream._users += 1
+            return stream
+        stream = _OPEN_STREAMS[stream_name] = LogStream(stream_name)
+        return stream
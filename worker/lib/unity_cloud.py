@@ -1,28 +1,28 @@
 import os
-import requests
-from typing import Dict, Any, Optional
+import shutil
+from typing import Dict, Any, BinaryIO, Optional, Tuple
+from lib.http_session import LazySession
 from lib.streams import LogStream
+from lib.zip import extract_build
 
 
-def download_unity_cloud_artifact(
-    job: Dict[str, Any], 
-    stream: LogStream
-) -> str:
+# HTTP session shared by all artifact downloads. Connections to the Unity CDN
+# are kept alive between jobs, and gateway errors are retried with a backoff.
+_session = LazySession(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504))
+
+
+def _primary_artifact(job: Dict[str, Any]) -> Tuple[str, str]:
     """
-    Download the primary artifact from a Unity Cloud Build job.
-    
-    Extracts the artifact URL from the metadata (the original webhook payload)
-    and downloads it to a temporary directory.
+    Find the primary artifact (the .ZIP file) in a Unity Cloud Build job.
     
     Args:
         job: The job dictionary containing metadata with artifact information
-        stream: LogStream instance for logging progress
     
     Returns:
-        Path to the downloaded artifact file
+        Tuple of (artifact URL, artifact filename)
     
     Raises:
-        Exception: If artifact not found, download fails, or extraction fails
+        Exception: If no primary artifact is found or it is missing its URL or filename
     """
     metadata = job.get("metadata", {})
     links = metadata.get("links", {})
@@ -46,6 +46,54 @@ def download_unity_cloud_artifact(
     if not artifact_url or not artifact_filename:
         raise Exception("Primary artifact missing URL or filename")
     
+    return artifact_url, artifact_filename
+
+
+def _copy_response(artifact_url: str, dest: BinaryIO) -> None:
+    """Stream an artifact download into a writable binary file object.
+    
+    Raises:
+        Exception: If the download fails
+        IOError: If writing to dest fails
+    """
+    import requests
+    import urllib3
+    
+    try:
+        # Closing the response returns its connection to the session's pool
+        with _session().get(artifact_url, stream=True, timeout=300) as response:
+            response.raise_for_status()
+            
+            # Copy in 4 MB blocks straight from the raw response, still undoing
+            # any gzip/deflate transfer encoding
+            response.raw.decode_content = True
+            shutil.copyfileobj(response.raw, dest, length=4 * 1024 * 1024)
+    except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
+        raise Exception(f"Failed to download Unity Cloud artifact: {str(e)}")
+
+
+def download_unity_cloud_artifact(
+    job: Dict[str, Any], 
+    stream: LogStream
+) -> str:
+    """
+    Download the primary artifact from a Unity Cloud Build job.
+    
+    Extracts the artifact URL from the metadata (the original webhook payload)
+    and downloads it to a temporary directory.
+    
+    Args:
+        job: The job dictionary containing metadata with artifact information
+        stream: LogStream instance for logging progress
+    
+    Returns:
+        Path to the downloaded artifact file
+    
+    Raises:
+        Exception: If artifact not found, download fails, or extraction fails
+    """
+    artifact_url, artifact_filename = _primary_artifact(job)
+    
     # Determine temp directory
     temp_path = os.environ.get("TEMP_BUILD_PATH", "/tmp")
     artifact_path = os.path.join(temp_path, f"unity_cloud_{job['id']}_{artifact_filename}")
@@ -54,19 +102,50 @@ def download_unity_cloud_artifact(
         stream.log(f"Downloading Unity Cloud Build artifact: {artifact_filename}")
         
         # Download the artifact with streaming to handle large files
-        response = requests.get(artifact_url, stream=True, timeout=300)
-        response.raise_for_status()
-        
-        # Write to disk
+        os.makedirs(temp_path, exist_ok=True)
         with open(artifact_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+            _copy_response(artifact_url, f)
         
         stream.log(f"Successfully downloaded artifact to: {artifact_path}")
         return artifact_path
         
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Failed to download Unity Cloud artifact: {str(e)}")
     except IOError as e:
         raise Exception(f"Failed to save artifact to disk: {str(e)}")
+
+
+def download_and_extract_unity_cloud_artifact(
+    job: Dict[str, Any],
+    stream: LogStream,
+    dest_dir: Optional[str] = None
+) -> str:
+    """
+    Download the primary artifact from a Unity Cloud Build job and extract it.
+    
+    For jobs that only need the extracted build (e.g. Steam-only jobs). The
+    zip is downloaded into TEMP_BUILD_PATH, extracted in parallel with the
+    same extractor as unzip_build (bypassing its cache, since the archive is
+    never seen again) and deleted as soon as extraction finishes.
+    
+    Args:
+        job: The job dictionary containing metadata with artifact information
+        stream: LogStream instance for logging progress
+        dest_dir: Directory to extract into (default: TEMP_BUILD_PATH/unity_cloud_{job id})
+    
+    Returns:
+        Path to the directory containing the extracted build
+    
+    Raises:
+        Exception: If artifact not found, download fails, or extraction fails
+    """
+    if not dest_dir:
+        temp_path = os.environ.get("TEMP_BUILD_PATH", "/tmp")
+        dest_dir = os.path.join(temp_path, f"unity_cloud_{job['id']}")
+    
+    artifact_path = download_unity_cloud_artifact(job, stream)
+    try:
+        return extract_build(artifact_path, dest_dir, stream)
+    finally:
+        try:
+            os.remove(artifact_path)
+        except OSError:
+            pass
@@ -1,8 +1,179 @@
+import fcntl
+import hashlib
+import heapq
 import shutil
 import os
+import tempfile
+import threading
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
 from lib.streams import LogStream
 
+
+# Size of reads when streaming build files into an archive or out of one
+_READ_SIZE = 1024 * 1024
+
+# Game builds are mostly already-compressed assets, so archive entries are
+# stored by default and archiving is bound by disk speed rather than DEFLATE.
+# Set ZIP_COMPRESSION=deflate to compress entries instead.
+ZIP_COMPRESSION = (
+    zipfile.ZIP_DEFLATED
+    if os.environ.get("ZIP_COMPRESSION", "stored").lower() == "deflate"
+    else zipfile.ZIP_STORED
+)
+
+# DEFLATE level used when compression is enabled. Level 1 is several times
+# faster than zlib's default of 6 and costs only a few percent in size.
+ZIP_COMPRESSLEVEL = int(os.environ.get("ZIP_COMPRESSLEVEL", "1"))
+# ZipInfo's per-entry level is public as compress_level from Python 3.13;
+# earlier versions only have the private _compresslevel
+_COMPRESS_LEVEL_ATTR = "compress_level" if hasattr(zipfile.ZipInfo, "compress_level") else "_compresslevel"
+
+# File types that are already compressed, so DEFLATE would not shrink them.
+# In a deflate archive these entries are always stored.
+_INCOMPRESSIBLE_SUFFIXES = frozenset({
+    '.zip', '.gz', '.7z', '.png', '.jpg', '.jpeg', '.mp3', '.mp4', '.ogg',
+    '.wem', '.bundle', '.apk', '.aab', '.pak', '.assets', '.unitypackage',
+})
+
+# Share of a build's bytes in already-compressed files above which a
+# deflate archive is written with stored entries instead
+_INCOMPRESSIBLE_RATIO = 0.9
+
+# Number of extracted builds kept under TEMP_BUILD_PATH/unzipped for reuse
+UNZIP_CACHE_ENTRIES = max(1, int(os.environ.get("UNZIP_CACHE_ENTRIES", "3")))
+
+# Number of threads extracting one archive. zlib releases the GIL while
+# inflating, so entries are decompressed in parallel.
+UNZIP_WORKERS = max(1, int(os.environ.get("UNZIP_WORKERS", str(min(8, os.cpu_count() or 1)))))
+
+# Open, shared-locked cache entry lock files held by each job, by job ID
+_LEASES: Dict[str, List[int]] = {}
+# Uncached extraction directories made for each job, by job ID
+_SCRATCH: Dict[str, List[str]] = {}
+_LEASES_LOCK = threading.Lock()
+
+
+class _ChunkBuffer:
+    """Write-only file object that collects zip output until it is taken.
+
+    It has no tell or seek, so zipfile treats it as an unseekable stream and
+    writes data descriptors after each entry instead of patching headers.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def take(self) -> bytes:
+        """Return everything written so far and empty the buffer."""
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _scan_build(directory_path: str) -> List[Tuple[str, zipfile.ZipInfo]]:
+    """List (source path, ZipInfo) for every directory and file in a build.
+    
+    The tree is read with os.scandir and each entry is stat'ed once, with the
+    same result used for its ZipInfo and for choosing the compression. Entries
+    are in sorted order so archives of the same build are identical: each
+    directory's subdirectories then files, followed by each subdirectory's
+    contents, as with a sorted os.walk. Entries that are neither directories
+    nor regular files (FIFOs, sockets, devices, dangling symlinks) are skipped.
+    """
+    entries: List[Tuple[str, zipfile.ZipInfo]] = []
+    pending = [("", directory_path)]
+    while pending:
+        prefix, path = pending.pop()
+        with os.scandir(path) as it:
+            children = sorted(it, key=lambda child: child.name)
+        dirs = [child for child in children if child.is_dir()]
+        files = [child for child in children if not child.is_dir() and child.is_file()]
+        for child in dirs:
+            entries.append((child.path, _zipinfo(prefix + child.name, child.stat(), True)))
+        for child in files:
+            entries.append((child.path, _zipinfo(prefix + child.name, child.stat(), False)))
+        # Symlinked directories get an entry but are not descended into
+        pending.extend(
+            (f"{prefix}{child.name}/", child.path)
+            for child in reversed(dirs) if not child.is_symlink()
+        )
+    return entries
+
+
+def _zipinfo(arcname: str, st: os.stat_result, is_dir: bool) -> zipfile.ZipInfo:
+    """Build the ZipInfo that ZipInfo.from_file would, from an existing stat."""
+    if is_dir:
+        arcname += '/'
+    zinfo = zipfile.ZipInfo(arcname, time.localtime(st.st_mtime)[0:6])
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+    if is_dir:
+        # Sizes and CRC are final, so ZipFile.mkdir can write the entry as is
+        zinfo.file_size = zinfo.compress_size = zinfo.CRC = 0
+        zinfo.external_attr |= 0x10
+    else:
+        zinfo.file_size = st.st_size
+    return zinfo
+
+
+def _is_incompressible(filename: str) -> bool:
+    """Return True if a file name has an already-compressed type."""
+    return os.path.splitext(filename)[1].lower() in _INCOMPRESSIBLE_SUFFIXES
+
+
+def _archive_compression(entries: List[Tuple[str, zipfile.ZipInfo]]) -> int:
+    """Choose the compression method for an archive of a scanned build.
+    
+    Returns ZIP_COMPRESSION, except that a deflate archive whose bytes are
+    mostly (over _INCOMPRESSIBLE_RATIO) already-compressed files is stored.
+    """
+    if ZIP_COMPRESSION == zipfile.ZIP_STORED:
+        return zipfile.ZIP_STORED
+    
+    total = incompressible = 0
+    for _, zinfo in entries:
+        total += zinfo.file_size
+        if _is_incompressible(zinfo.filename):
+            incompressible += zinfo.file_size
+    if total and incompressible > total * _INCOMPRESSIBLE_RATIO:
+        return zipfile.ZIP_STORED
+    return ZIP_COMPRESSION
+
+
+def _iter_entries(directory_path: str, stream: LogStream) -> Iterator[Tuple[str, zipfile.ZipInfo]]:
+    """Yield (source path, ZipInfo) for every directory and file in a build.
+    
+    File entries use the compression chosen by _archive_compression and
+    ZIP_COMPRESSLEVEL, except that already-compressed file types are stored.
+    """
+    entries = _scan_build(directory_path)
+    compression = _archive_compression(entries)
+    if compression != ZIP_COMPRESSION:
+        stream.log("Build is mostly already-compressed files, storing entries without compression")
+    for src, zinfo in entries:
+        if not zinfo.is_dir():
+            if compression != zipfile.ZIP_STORED and _is_incompressible(zinfo.filename):
+                zinfo.compress_type = zipfile.ZIP_STORED
+            else:
+                zinfo.compress_type = compression
+            # ZipInfo leaves the level unset, which means zlib's default,
+            # and ZipFile(compresslevel=...) does not apply to it
+            setattr(zinfo, _COMPRESS_LEVEL_ATTR, ZIP_COMPRESSLEVEL)
+        yield src, zinfo
+
+
 def zip_build(job_id: str, directory_path: str, stream: LogStream) -> str:
     """
     Create a zip archive of a build directory.
@@ -20,7 +191,9 @@ def zip_build(job_id: str, directory_path: str, stream: LogStream) -> str:
 
     # Make the zip archive
     try:
-        shutil.make_archive(zip_path.replace('.zip', ''), 'zip', directory_path)
+        os.makedirs(temp_path, exist_ok=True)
+        with open(zip_path, 'wb') as f:
+            zip_build_to_fileobj(directory_path, f, stream)
         stream.log(f"Successfully created zip file: {zip_path}")
     except Exception as e:
         stream.log(f"Error creating zip: {str(e)}", level="error")
@@ -28,14 +201,50 @@ def zip_build(job_id: str, directory_path: str, stream: LogStream) -> str:
     return zip_path
 
 
-def unzip_build(zip_path: str, job_id: str, stream: LogStream) -> str:
+def zip_build_to_fileobj(directory_path: str, fileobj: BinaryIO, stream: LogStream) -> None:
     """
-    Extract a zip archive to a temporary directory.
+    Write a zip archive of a build directory to an open binary file object.
+    
+    Each file is copied into its entry in large blocks. The file object does
+    not need to be seekable (e.g. a pipe or socket); zipfile then writes a data
+    descriptor after each entry instead of going back to patch its header.
+    
+    Args:
+        directory_path: Path to the build directory
+        fileobj: Writable binary file object receiving the archive
+        stream: LogStream instance for logging progress
+    """
+    with zipfile.ZipFile(fileobj, 'w', compression=ZIP_COMPRESSION, allowZip64=True) as zf:
+        for src, zinfo in _iter_entries(directory_path, stream):
+            if zinfo.is_dir():
+                zf.mkdir(zinfo)
+                continue
+            with open(src, 'rb') as s, zf.open(zinfo, 'w') as d:
+                shutil.copyfileobj(s, d, _READ_SIZE)
+
+
+def unzip_build(zip_path: str, job_id: str, stream: LogStream, cache: bool = True) -> str:
+    """
+    Extract a zip archive to a cached directory under TEMP_BUILD_PATH.
+    
+    Extractions are cached by the archive's real path, device, inode, size and
+    nanosecond modification time, so a repeat job for the same archive reuses
+    the earlier extraction instead of decompressing it again. Only the
+    UNZIP_CACHE_ENTRIES most recently used extractions are kept.
+    
+    The returned directory is leased to the job (a shared lock that every
+    worker process respects) until release_extracted_builds(job_id) is called,
+    so no other job's cache sweep can delete it while it is being uploaded.
+    
+    Archives that only exist for one job (e.g. a downloaded artifact) can never
+    be reused, so pass cache=False for them: they are extracted to a directory
+    of their own, which release_extracted_builds(job_id) deletes.
     
     Args:
         zip_path: Path to the zip file
-        job_id: ID of the job (used for naming temp directory)
+        job_id: ID of the job (holds the lease and names the in-progress directory)
         stream: LogStream instance for logging progress
+        cache: Reuse and keep the extraction in the unzip cache
     
     Returns:
         Path to the directory containing extracted files
@@ -43,14 +252,263 @@ def unzip_build(zip_path: str, job_id: str, stream: LogStream) -> str:
     Raises:
         Exception: If extraction fails
     """
-    temp_extract_dir = os.path.join(os.path.dirname(zip_path), f"extract_{job_id}")
+    temp_path = os.environ.get("TEMP_BUILD_PATH", "/tmp")
+    if not cache:
+        os.makedirs(temp_path, exist_ok=True)
+        dest_dir = tempfile.mkdtemp(prefix=f"{job_id}_unzipped_", dir=temp_path)
+        with _LEASES_LOCK:
+            _SCRATCH.setdefault(job_id, []).append(dest_dir)
+        return extract_build(zip_path, dest_dir, stream)
+    
+    cache_root = os.path.join(temp_path, "unzipped")
     
     try:
-        os.makedirs(temp_extract_dir, exist_ok=True)
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(temp_extract_dir)
-        stream.log(f"Successfully extracted zip to: {temp_extract_dir}")
-        return temp_extract_dir
+        os.makedirs(cache_root, exist_ok=True)
+        cache_dir = os.path.join(cache_root, _cache_key(zip_path))
+        
+        # Lease the entry before looking at it; a sweep only deletes entries
+        # it can lock exclusively. Its lock file also records recent use.
+        lock_fd = _lock_entry(cache_dir, fcntl.LOCK_SH)
+        _hold_lease(job_id, lock_fd)
+        os.utime(f"{cache_dir}.lock")
+        
+        # The directory only ever appears by an atomic rename of a complete
+        # extraction, so if it exists it can be reused as-is
+        if os.path.isdir(cache_dir):
+            stream.log(f"Reusing extracted build: {cache_dir}")
+            return cache_dir
+        
+        # Extract into a private directory and publish it with a rename
+        tmp_dir = f"{cache_dir}.tmp-{os.getpid()}-{job_id}"
+        try:
+            os.makedirs(tmp_dir, exist_ok=True)
+            _extract_parallel(zip_path, tmp_dir)
+            try:
+                os.rename(tmp_dir, cache_dir)
+            except OSError:
+                # Another job published the same extraction first
+                if not os.path.isdir(cache_dir):
+                    raise
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        
+        _sweep_unzip_cache(cache_root)
+        stream.log(f"Successfully extracted zip to: {cache_dir}")
+        return cache_dir
     except Exception as e:
         stream.log(f"Error extracting zip: {str(e)}", level="error")
         raise Exception(f"Error extracting zip: {str(e)}")
+
+
+def extract_build(zip_path: str, dest_dir: str, stream: LogStream) -> str:
+    """
+    Extract a zip archive into a directory, without using the unzip cache.
+    
+    Args:
+        zip_path: Path to the zip file
+        dest_dir: Directory to extract into (created if missing)
+        stream: LogStream instance for logging progress
+    
+    Returns:
+        dest_dir
+    
+    Raises:
+        Exception: If extraction fails
+    """
+    try:
+        os.makedirs(dest_dir, exist_ok=True)
+        _extract_parallel(zip_path, dest_dir)
+    except Exception as e:
+        stream.log(f"Error extracting zip: {str(e)}", level="error")
+        raise Exception(f"Error extracting zip: {str(e)}")
+    stream.log(f"Successfully extracted zip to: {dest_dir}")
+    return dest_dir
+
+
+def release_extracted_builds(job_id: str) -> None:
+    """Release the leases unzip_build took for a job, letting sweeps delete those extractions.
+    
+    Uncached extractions made for the job are deleted.
+    """
+    with _LEASES_LOCK:
+        fds = _LEASES.pop(job_id, [])
+        scratch = _SCRATCH.pop(job_id, [])
+    for fd in fds:
+        os.close(fd)
+    for path in scratch:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _cache_key(zip_path: str) -> str:
+    """Return the cache directory name identifying one archive file and version."""
+    st = os.stat(zip_path)
+    identity = f"{os.path.realpath(zip_path)}|{st.st_dev}|{st.st_ino}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()[:32]
+
+
+def _hold_lease(job_id: str, fd: int) -> None:
+    """Keep a cache entry lock open until the job releases its extracted builds."""
+    with _LEASES_LOCK:
+        _LEASES.setdefault(job_id, []).append(fd)
+
+
+def _lock_entry(cache_dir: str, operation: int) -> int:
+    """Open and flock the lock file beside a cache entry, returning its descriptor.
+    
+    A sweep unlinks the lock file of an entry it deletes, so after locking the
+    file is checked to still be the one at the path; if not, locking is retried.
+    
+    Raises:
+        BlockingIOError: If operation includes LOCK_NB and the entry is locked
+    """
+    lock_path = f"{cache_dir}.lock"
+    while True:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, operation)
+            current = os.stat(lock_path)
+        except FileNotFoundError:
+            os.close(fd)
+            continue
+        except BaseException:
+            os.close(fd)
+            raise
+        locked = os.fstat(fd)
+        if (locked.st_dev, locked.st_ino) == (current.st_dev, current.st_ino):
+            return fd
+        os.close(fd)
+
+
+def _extract_parallel(zip_path: str, dest: str) -> None:
+    """Extract a zip archive using up to UNZIP_WORKERS threads.
+    
+    Files are spread over the threads by compressed size (largest first, each
+    to the least loaded thread), so one huge asset does not leave the other
+    threads idle, and each thread reads its files in archive order. ZipFile
+    objects are not thread-safe, so every thread opens its own handle. All directories are
+    created up front in one pass so threads never race to create the same
+    one, and each file is then streamed out in _READ_SIZE blocks.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        members = []
+        for info in zip_ref.infolist():
+            target = _member_path(info.filename, dest)
+            if target is not None:
+                members.append((info, target))
+        
+        # Directory entries and the parents of every file
+        for directory in {target if info.is_dir() else os.path.dirname(target) for info, target in members}:
+            os.makedirs(directory, exist_ok=True)
+        files = [(info, target) for info, target in members if not info.is_dir()]
+        
+        if UNZIP_WORKERS == 1 or len(files) < 2 * UNZIP_WORKERS:
+            _extract_files(zip_ref, files)
+            return
+    
+    runs = _balance_runs(files, UNZIP_WORKERS)
+    
+    def extract_run(run: List[Tuple[zipfile.ZipInfo, str]]) -> None:
+        with zipfile.ZipFile(zip_path, 'r') as local:
+            _extract_files(local, run)
+    
+    with ThreadPoolExecutor(max_workers=len(runs), thread_name_prefix="unzip") as executor:
+        # Surface the first failure, if any
+        for _ in executor.map(extract_run, runs):
+            pass
+
+
+def _balance_runs(files: List[Tuple[zipfile.ZipInfo, str]], count: int) -> List[List[Tuple[zipfile.ZipInfo, str]]]:
+    """Split archive members into count runs of roughly equal compressed size."""
+    runs: List[List[Tuple[zipfile.ZipInfo, str]]] = [[] for _ in range(count)]
+    loads = [(0, index) for index in range(count)]
+    for member in sorted(files, key=lambda member: member[0].compress_size, reverse=True):
+        load, index = heapq.heappop(loads)
+        runs[index].append(member)
+        heapq.heappush(loads, (load + member[0].compress_size, index))
+    for run in runs:
+        run.sort(key=lambda member: member[0].header_offset)
+    return [run for run in runs if run]
+
+
+def _member_path(filename: str, dest: str) -> Optional[str]:
+    """Return where an archive member is extracted under dest, or None to skip it.
+    
+    Follows ZipFile.extract: absolute paths, drive letters and '.' or '..'
+    components are dropped, so no member can be written outside dest.
+    """
+    arcname = os.path.splitdrive(filename.replace('/', os.sep))[1]
+    parts = [part for part in arcname.split(os.sep) if part not in ('', os.curdir, os.pardir)]
+    if not parts:
+        return None
+    return os.path.join(dest, *parts)
+
+
+def _extract_files(zf: zipfile.ZipFile, files: List[Tuple[zipfile.ZipInfo, str]]) -> None:
+    """Stream file members of an open archive to their target paths."""
+    for info, target in files:
+        with zf.open(info) as src, open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst, _READ_SIZE)
+
+
+def _sweep_unzip_cache(cache_root: str) -> None:
+    """Remove least recently used extractions beyond UNZIP_CACHE_ENTRIES.
+    
+    Entries leased by a running job, in any worker process, are skipped.
+    """
+    locks = []
+    with os.scandir(cache_root) as entries:
+        for entry in entries:
+            if entry.name.endswith('.lock'):
+                locks.append((entry.stat().st_mtime, entry.path[:-len('.lock')]))
+    locks.sort(reverse=True)
+    for _, cache_dir in locks[UNZIP_CACHE_ENTRIES:]:
+        try:
+            fd = _lock_entry(cache_dir, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            continue
+        try:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            os.remove(f"{cache_dir}.lock")
+        finally:
+            os.close(fd)
+
+
+def zip_build_stream(directory_path: str, stream: LogStream, chunk_size: int = 32 * 1024 * 1024) -> Iterator[bytes]:
+    """
+    Generate a zip archive of a build directory as a sequence of byte chunks.
+    
+    The archive is produced incrementally so it can be uploaded while it is
+    being created, without writing a temporary zip file to disk.
+    
+    Args:
+        directory_path: Path to the build directory
+        stream: LogStream instance for logging progress
+        chunk_size: Minimum size of each yielded chunk (the final chunk may be smaller)
+    
+    Yields:
+        Consecutive chunks of the zip archive
+    """
+    buffer = _ChunkBuffer()
+    try:
+        with zipfile.ZipFile(buffer, 'w', compression=ZIP_COMPRESSION) as zf:
+            for src, zinfo in _iter_entries(directory_path, stream):
+                if zinfo.is_dir():
+                    zf.mkdir(zinfo)
+                    continue
+                with open(src, 'rb') as s, zf.open(zinfo, 'w') as d:
+                    while True:
+                        block = s.read(_READ_SIZE)
+                        if not block:
+                            break
+                        d.write(block)
+                        if len(buffer) >= chunk_size:
+                            yield buffer.take()
+    except Exception as e:
+        stream.log(f"Error creating zip: {str(e)}", level="error")
+        raise Exception(f"Error creating zip: {str(e)}")
+    
+    # Remaining entry data and the central directory
+    yield buffer.take()
+    stream.log(f"Successfully streamed zip of {directory_path}")
@@ -1,30 +1,30 @@
 import json
 import os
 import sys
+import shutil
+import queue
+import threading
 import redis
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Union
 from datetime import datetime, timezone
-from lib.streams import LogStream
-from lib.cdn import CDNUploader, prepare_cdn_file
-from lib.zip import zip_build
-from lib.steam import SteamUploader, SteamVDFBuilder, prepare_steam_build, handle_steam_upload
+from lib.json_codec import dumps, loads
+from lib.paths import classify_path
+from lib.redis_pool import POOL
+from lib.streams import LogStream, get_log_stream
+from lib.cdn import CDNUploader, get_cdn_mode, prepare_cdn_file
+from lib.zip import release_extracted_builds, zip_build_stream
+from lib.steam import prepare_steam_build, handle_steam_upload
 from lib.notifications import NotificationService
-from lib.unity_cloud import download_unity_cloud_artifact
+from lib.unity_cloud import download_unity_cloud_artifact, download_and_extract_unity_cloud_artifact
 
 # ===============================================================
 # Conection & Queue Setup
 # ===============================================================
 
 try:
-    # Connect to Valkey
-    use_ssl = os.environ.get("VALKEY_USE_SSL", "false").lower() == "true"
-    kv_store: redis.Redis = redis.Redis(
-        host=os.environ.get("VALKEY_HOST", "valkey"),
-        port=int(os.environ.get("VALKEY_PORT", 6379)),
-        password=os.environ.get("VALKEY_PASSWORD", "change_in_production"),
-        ssl=use_ssl,
-        decode_responses=True, 
-    )
+    # Connect to Valkey through the shared connection pool
+    kv_store: redis.Redis = redis.Redis(connection_pool=POOL)
 except Exception as e:
     print(f"Error connecting to valkey: {str(e)}", file=sys.stderr)
     exit(1)
@@ -35,6 +35,20 @@ RUNNING_JOBS: str = "running_jobs"
 COMPLETE_JOBS: str = "complete_jobs"
 FAILED_JOBS: str = "failed_jobs"
 
+# Number of queued jobs taken at once. Jobs taken together are shared among the
+# WORKER_CONCURRENCY job threads (or run back-to-back on one) and wait in
+# running_jobs until they start, so keep this at 1 when several workers share
+# the queue and jobs are long-running.
+JOB_BATCH: int = max(1, int(os.environ.get("JOB_BATCH", "1")))
+
+# Number of jobs this worker runs at the same time, each on its own thread.
+# Uploads are network- and SteamCMD-bound, so threads overlap well; keep this at
+# 1 if jobs upload to Steam, since SteamCMD runs share the cached login.
+WORKER_CONCURRENCY: int = max(1, int(os.environ.get("WORKER_CONCURRENCY", "1")))
+
+# Most CDN channels of one job uploaded at the same time
+CDN_CHANNEL_WORKERS: int = 8
+
 # Initialize notification service
 notification_service: NotificationService = NotificationService()
 
@@ -42,7 +56,30 @@ notification_service: NotificationService = NotificationService()
 # Utility Functions
 # ===============================================================
 
-def abort_job(job: Dict[str, Any], stream: LogStream, error_message: str, current_job_str: str = None) -> None:
+def pop_jobs(count: int = JOB_BATCH) -> List[bytes]:
+    """Block until jobs are queued and move up to count of them to running_jobs.
+    
+    Each job is moved with BLMOVE/LMOVE (Valkey/Redis 6.2+), which takes it off
+    the queue and appends it to running_jobs in one server-side step, so a job
+    is never lost if the worker dies right after taking it. Jobs after the
+    first are moved without blocking, in one pipelined round trip.
+    
+    Args:
+        count: Most jobs to move (default: JOB_BATCH)
+    
+    Returns:
+        Raw JSON bodies of the moved jobs, in queue order, as stored in running_jobs
+    """
+    raws = [kv_store.blmove(QUEUED_JOBS, RUNNING_JOBS, 0, "LEFT", "RIGHT")]
+    if count > 1:
+        with kv_store.pipeline(transaction=False) as pipe:
+            for _ in range(count - 1):
+                pipe.lmove(QUEUED_JOBS, RUNNING_JOBS, "LEFT", "RIGHT")
+            raws.extend(raw for raw in pipe.execute() if raw is not None)
+    return raws
+
+
+def abort_job(job: Dict[str, Any], stream: LogStream, error_message: str, current_job_str: Optional[Union[str, bytes]] = None) -> None:
     """Abort the job, log the error, and move it to the failed jobs list.
     
     Args:
@@ -54,50 +91,209 @@ def abort_job(job: Dict[str, Any], stream: LogStream, error_message: str, curren
     stream.log(f"Aborting job {job['id']}: {error_message}", level="error")
     print(f"Error aborting job {job['id']}: {error_message}", file=sys.stderr)
     
-    # Remove from running jobs - try exact match first, then by ID
-    if current_job_str:
-        kv_store.lrem(RUNNING_JOBS, 0, current_job_str)
-    else:
-        # Remove the job by ID if exact match not provided
+    # Find the running jobs entry - use the exact match if given, otherwise by ID
+    if not current_job_str:
         running_jobs_raw = kv_store.lrange(RUNNING_JOBS, 0, -1)
         for job_str in running_jobs_raw:
             try:
-                stored_job = json.loads(job_str)
+                stored_job = loads(job_str)
                 if stored_job.get('id') == job['id']:
-                    kv_store.lrem(RUNNING_JOBS, 0, job_str)
+                    current_job_str = job_str
                     break
-            except json.JSONDecodeError:
+            except (json.JSONDecodeError, UnicodeDecodeError):
                 continue
     
     job["status"] = "failed"
     job["error"] = error_message
-    kv_store.rpush(FAILED_JOBS, json.dumps(job))
+    
+    # Make sure the job's log is written before the failure is announced
+    stream.flush()
+    
+    # Move the job from running to failed in one atomic round trip
+    with kv_store.pipeline(transaction=True) as pipe:
+        if current_job_str:
+            pipe.lrem(RUNNING_JOBS, 0, current_job_str)
+        pipe.rpush(FAILED_JOBS, dumps(job))
+        pipe.execute()
     
     # Send notification about job failure
     notification_service.send_job_notification(job, 'failed', error_message)
 
+def start_job(job: Dict[str, Any], raw: bytes) -> bytes:
+    """Mark the job as running in the running jobs list.
+    
+    Args:
+        job: The job dictionary to start
+        raw: The job's entry in running_jobs as moved there by pop_jobs
+    
+    Returns:
+        The exact serialized job now in running_jobs, used to remove it later
+    """
+    # Update the job status to running and keep a clean copy of the current job state
+    job["status"] = "running"
+    job["startedAt"] = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+    current_job: bytes = dumps(job)
+
+    # Replace the queued entry with the running one in one atomic round trip
+    with kv_store.pipeline(transaction=True) as pipe:
+        pipe.lrem(RUNNING_JOBS, 1, raw)
+        pipe.rpush(RUNNING_JOBS, current_job)
+        pipe.execute()
+    return current_job
+
 # ===============================================================
 # Main Job Handling Function
 # ===============================================================
 
-def handle_job(job: Dict[str, Any], stream: LogStream) -> None:
+def upload_cdn_channels(job: Dict[str, Any], stream: LogStream, path_kind: Optional[str] = None) -> None:
+    """Upload the job's build to every configured CDN channel.
+    
+    Channels are uploaded at the same time (up to CDN_CHANNEL_WORKERS), since
+    each upload is network-bound. Results are recorded in channel order.
+    
+    Args:
+        job: The job dictionary, with cdn_channels and ingest paths set
+        stream: LogStream instance for logging progress
+        path_kind: classify_path result for the ingest path, if already known
+    
+    Raises:
+        Exception: If preparing the build or any upload fails
+    """
+    cdn_channels: list = job.get("cdn_channels", [])
+    cdn_file_path: Optional[str] = None
+    try:
+        # Prepare the file for CDN upload
+        # e.g., zip if it's a directory
+        cdn_file_path = prepare_cdn_file(job, stream, path_kind)
+        is_directory = os.path.isdir(cdn_file_path)
+        
+        def upload_channel(channel: Dict[str, Any]) -> Dict[str, Any]:
+            stream.log(f"Uploading to CDN channel '{channel.get('label')}'...")
+
+            # Initialize CDN uploader and upload the file (or directory contents)
+            uploader = CDNUploader(channel)
+            if is_directory and get_cdn_mode(job) == 'stream':
+                result = uploader.upload_stream(f"{job['id']}.zip", zip_build_stream(cdn_file_path, stream), stream)
+            elif is_directory:
+                result = uploader.upload_directory(cdn_file_path, job["id"], stream)
+            else:
+                result = uploader.upload_file(cdn_file_path, stream)
+            return {
+                "channel": channel.get("label"),
+                "url": result.get("url"),
+                "success": True
+            }
+        
+        if len(cdn_channels) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(cdn_channels), CDN_CHANNEL_WORKERS), thread_name_prefix=f"cdn-{job['id']}") as executor:
+                futures = [executor.submit(upload_channel, channel) for channel in cdn_channels]
+            # All uploads have finished here; surface the first failure, if any
+            results = [future.result() for future in futures]
+        else:
+            results = [upload_channel(channel) for channel in cdn_channels]
+
+        # Add CDN upload results to tracking
+        job["upload_results"]["cdn"].extend(results)
+    # Handle exceptions during CDN upload        
+    except Exception as e:
+        stream.log(f"CDN upload failed: {str(e)}", level="error")
+        raise
+    finally:
+        # A zip made from a directory build is only used by the CDN channels
+        if cdn_file_path and cdn_file_path != job.get("absoluteIngestPath"):
+            remove_temp_path(cdn_file_path)
+
+
+def upload_steam_channels(job: Dict[str, Any], stream: LogStream, path_kind: Optional[str] = None) -> None:
+    """Upload the job's build to every configured Steam channel.
+    
+    Args:
+        job: The job dictionary, with steam_channels and ingest paths set
+        stream: LogStream instance for logging progress
+        path_kind: classify_path result for the ingest path, if already known
+    
+    Raises:
+        Exception: If preparing the build or any upload fails
+    """
+    try:
+        # Prepare the build for Steam upload
+        # e.g., create Steam VDF files, zip if necessary
+        steam_build_path = prepare_steam_build(job, stream, path_kind)
+        handle_steam_upload(job, steam_build_path, stream)
+
+        # Add Steam results to tracking
+        for result in job.get("steam_results", []):
+            job["upload_results"]["steam"].append({
+                "channel": result.get("channel"),
+                "app_id": result.get("app_id"),
+                "success": True
+            })
+
+    except Exception as e:
+        stream.log(f"Steam upload failed: {str(e)}", level="error")
+        raise
+
+
+def run_uploads(job: Dict[str, Any], stream: LogStream) -> None:
+    """Upload the job's build to its CDN and Steam channels.
+    
+    The two steps are mostly network-bound and independent, so when a job has
+    both they run at the same time.
+    
+    Args:
+        job: The job dictionary, with ingest paths set
+        stream: LogStream instance for logging progress
+    
+    Raises:
+        OSError: If the ingest path exists but cannot be stat'ed
+        Exception: If either upload step fails, after both have finished
+    """
+    uploads = []
+    if job.get("cdn_channels") and job.get("ingestPath") and job.get("absoluteIngestPath"):
+        uploads.append(upload_cdn_channels)
+    if job.get("steam_channels") and job.get("ingestPath") and job.get("absoluteIngestPath"):
+        uploads.append(upload_steam_channels)
+    # Both steps start from the same ingest path, so it is only stat'ed once
+    path_kind: Optional[str] = None
+    if uploads:
+        try:
+            path_kind = classify_path(job["absoluteIngestPath"])
+        except OSError as e:
+            stream.log(f"Cannot access build path {job['absoluteIngestPath']}: {e.strerror}", level="error")
+            raise
+    if len(uploads) > 1:
+        with ThreadPoolExecutor(max_workers=len(uploads), thread_name_prefix=f"upload-{job['id']}") as executor:
+            futures = [executor.submit(upload, job, stream, path_kind) for upload in uploads]
+        # Both uploads have finished here; surface the first failure, if any
+        for future in futures:
+            future.result()
+    else:
+        for upload in uploads:
+            upload(job, stream, path_kind)
+
+
+def remove_temp_path(path: str) -> None:
+    """Delete a temporary file or directory made for a job, ignoring failures."""
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+    except OSError as e:
+        print(f"Error removing temporary path {path}: {str(e)}", file=sys.stderr)
+
+
+def handle_job(job: Dict[str, Any], stream: LogStream, current_job: bytes) -> None:
     """Process a single job.
     
     Args:
         job: The job dictionary to process
         stream: LogStream instance for logging job progress
+        current_job: The serialized job as pushed to running_jobs by start_job
     
     Raises:
         Exception: If job processing fails (caught and handled by caller)
     """
-    # Update the job status to running and keep a clean copy of the current job state
-    job["status"] = "running"
-    job["startedAt"] = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
-    current_job: str = json.dumps(job)
-
-    # Add the job to the running jobs list
-    kv_store.rpush(RUNNING_JOBS, current_job)
-    
     # Initialize results tracking
     job["upload_results"] = {
         "cdn": [],
@@ -108,12 +304,18 @@ def handle_job(job: Dict[str, Any], stream: LogStream) -> None:
     # Handle Unity Cloud Build artifact downloads
     # ================================================================
     stream.log(f"Job source: {job.get('source')}")
+    artifact_path: Optional[str] = None
     if job.get("source") == "unity-cloud":
         try:
             stream.log("Processing Unity Cloud Build job...")
             
-            # Download the artifact from Unity Cloud Build
-            artifact_path = download_unity_cloud_artifact(job, stream)
+            # Download the artifact from Unity Cloud Build. Jobs without CDN
+            # channels only need the extracted build, so the zip is extracted
+            # and deleted straight after the download.
+            if job.get("cdn_channels"):
+                artifact_path = download_unity_cloud_artifact(job, stream)
+            else:
+                artifact_path = download_and_extract_unity_cloud_artifact(job, stream)
             stream.log(f"Downloaded artifact: {artifact_path}")
             
             # Set ingest paths for the downstream steam/cdn functions
@@ -126,57 +328,28 @@ def handle_job(job: Dict[str, Any], stream: LogStream) -> None:
             stream.log(f"Failed to process Unity Cloud Build artifact: {str(e)}", level="error")
             raise
     
-    # Handle CDN uploads for all configured CDN channels
-    cdn_channels: list = job.get("cdn_channels", [])
-    if cdn_channels and job.get("ingestPath") and job.get("absoluteIngestPath"):
-        try:
-            # Prepare the file for CDN upload
-            # e.g., zip if it's a directory
-            cdn_file_path = prepare_cdn_file(job, stream)
-            for channel in cdn_channels:
-                stream.log(f"Uploading to CDN channel '{channel.get('label')}'...")
-
-                # Initialize CDN uploader and upload the file
-                uploader = CDNUploader(channel)
-                result = uploader.upload_file(cdn_file_path, stream)
-
-                # Add CDN upload result to tracking
-                job["upload_results"]["cdn"].append({
-                    "channel": channel.get("label"),
-                    "url": result.get("url"),
-                    "success": True
-                })
-        # Handle exceptions during CDN upload        
-        except Exception as e:
-            stream.log(f"CDN upload failed: {str(e)}", level="error")
-            raise
-    
-    # Handle Steam uploads for all configured Steam channels
-    steam_channels: list = job.get("steam_channels", [])
-    if steam_channels and job.get("ingestPath") and job.get("absoluteIngestPath"):
-        try:
-            # Prepare the build for Steam upload
-            # e.g., create Steam VDF files, zip if necessary
-            steam_build_path = prepare_steam_build(job, stream)
-            handle_steam_upload(job, steam_build_path, stream)
-
-            # Add Steam results to tracking
-            for result in job.get("steam_results", []):
-                job["upload_results"]["steam"].append({
-                    "channel": result.get("channel"),
-                    "app_id": result.get("app_id"),
-                    "success": True
-                })
-
-        except Exception as e:
-            stream.log(f"Steam upload failed: {str(e)}", level="error")
-            raise
+    # Run the CDN and Steam uploads
+    try:
+        run_uploads(job, stream)
+    finally:
+        # The downloaded artifact and leased extractions are only needed
+        # until every upload has finished
+        release_extracted_builds(job["id"])
+        if artifact_path:
+            remove_temp_path(artifact_path)
     
     # Remove job from running and add to complete marking it complete.
-    kv_store.lrem(RUNNING_JOBS, 0, current_job)
     job["status"] = "complete"
     job["completedAt"] = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
-    kv_store.rpush(COMPLETE_JOBS, json.dumps(job))
+    
+    # Make sure the job's log is written before completion is announced
+    stream.flush()
+    
+    # Move the job from running to complete in one atomic round trip
+    with kv_store.pipeline(transaction=True) as pipe:
+        pipe.lrem(RUNNING_JOBS, 0, current_job)
+        pipe.rpush(COMPLETE_JOBS, dumps(job))
+        pipe.execute()
     print("Processed job:", job.get("id"))
     
     # Send notification about successful completion
@@ -186,27 +359,98 @@ def handle_job(job: Dict[str, Any], stream: LogStream) -> None:
 # Main worker loop
 # ===============================================================
 
-print("Worker started, waiting for jobs...")
-while True:
-    # block until an item is available
-    _, raw = kv_store.blpop(QUEUED_JOBS)
-
+def process_job(raw: bytes) -> None:
+    """Run one job taken by pop_jobs from start to completion or failure.
+    
+    Args:
+        raw: The job's JSON entry as moved to running_jobs
+    """
     # Parse the job data
     try:
-        job: Dict[str, Any] = json.loads(raw)
+        job: Dict[str, Any] = loads(raw)
         print("Processing job:", job.get("id"))
-    except json.JSONDecodeError:
-        print("Invalid JSON encoding for job data:", raw, file=sys.stderr)
-        continue
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        print("Invalid JSON encoding for job data:", raw.decode('utf-8', 'replace'), file=sys.stderr)
+        kv_store.lrem(RUNNING_JOBS, 1, raw)
+        return
 
-    # Create a log stream for this job
-    stream: LogStream = LogStream(f'job_stream:{job["id"]}')
-    stream.log(f"Analyzing job {job['id']}...")
-    try:
-        # try to handle the job 
-        handle_job(job, stream)
-    except Exception as e:
-        # Log any errors and abort the job.
-        stream.log(f"Job processing failed: {str(e)}", level="error")
-        abort_job(job, stream, f"Job processing failed: {str(e)}")
-        continue
\ No newline at end of file
+    # Create a log stream for this job; closing it flushes buffered lines
+    with get_log_stream(f'job_stream:{job["id"]}') as stream:
+        stream.log(f"Analyzing job {job['id']}...")
+        current_job: Optional[bytes] = None
+        try:
+            # try to handle the job 
+            current_job = start_job(job, raw)
+            handle_job(job, stream, current_job)
+        except Exception as e:
+            # Log any errors and abort the job, removing its exact
+            # entry from running_jobs (still the moved one if it never started)
+            stream.log(f"Job processing failed: {str(e)}", level="error")
+            abort_job(job, stream, f"Job processing failed: {str(e)}", current_job or raw)
+
+
+def worker_loop() -> None:
+    """Take and process jobs until Valkey fails."""
+    while True:
+        # block until an item is available; taken jobs are already in running_jobs
+        for raw in pop_jobs():
+            process_job(raw)
+
+
+def run_workers(count: int) -> None:
+    """Run count job threads fed by one fetcher thread until a thread fails.
+    
+    The fetcher holds one permit per job from taking it until a thread has
+    finished it, and only takes as many jobs (up to JOB_BATCH per round trip)
+    as there are idle threads. Taken jobs therefore never wait locally for a
+    thread, and jobs other workers could run stay in queued_jobs.
+    
+    Raises:
+        BaseException: The first error that stopped a thread
+    """
+    failures: queue.Queue = queue.Queue()
+    jobs: queue.Queue = queue.Queue()
+    idle = threading.Semaphore(count)
+
+    def fetch() -> None:
+        while True:
+            # Wait for an idle thread, then claim any other idle ones
+            idle.acquire()
+            claimed = 1
+            while claimed < JOB_BATCH and idle.acquire(blocking=False):
+                claimed += 1
+            taken = pop_jobs(claimed)
+            for _ in range(claimed - len(taken)):
+                idle.release()
+            for raw in taken:
+                jobs.put(raw)
+
+    def work() -> None:
+        while True:
+            raw = jobs.get()
+            try:
+                process_job(raw)
+            finally:
+                idle.release()
+
+    def run(target) -> None:
+        try:
+            target()
+        except BaseException as e:
+            failures.put(e)
+
+    threading.Thread(target=run, args=(fetch,), name="job-fetcher", daemon=True).start()
+    for index in range(count):
+        threading.Thread(target=run, args=(work,), name=f"job-worker-{index}", daemon=True).start()
+    raise failures.get()
+
+
+print("Worker started, waiting for jobs...")
+try:
+    if WORKER_CONCURRENCY == 1:
+        worker_loop()
+    else:
+        run_workers(WORKER_CONCURRENCY)
+finally:
+    # Give in-flight notifications a chance to be delivered before exiting
+    notification_service.drain()